@@ -1,3 +1,17 @@
-from .ai_agent import AI2048
-from .qlearning_agent import QLearningAgent
-# from .expectimax_agent import ExpectimaxAgent
\ No newline at end of file
+import importlib
+
+# Agents are imported on first use: most of them need numpy, which the
+# engine and the A* agent do not.
+_EXPORTS = {
+    "AI2048": ".ai_agent",
+    "QLearningAgent": ".qlearning_agent",
+    "QTable": ".qtable",
+    "NTupleAgent": ".ntuple_agent",
+    "NTupleNetwork": ".ntuple_agent",
+    "MonteCarloAgent": ".monte_carlo_agent",
+}
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,20 +1,38 @@
 import random
 import heapq
-from copy import deepcopy
-import numpy as np
-from .qlearning_agent import QLearningAgent
+from game.logic import successors, check_game_status
 
 class AI2048:
-    def __init__(self, mode=None):
+    def __init__(self, mode=None, horizon=3, max_nodes=2000, beam_width=None, max_tile=2048, loss_penalty=4096):
         self.mode = mode if mode in ['a*', 'expectimax', 'random'] else 'random'
+        # A* limits: plan `horizon` moves ahead, generating at most max_nodes
+        # nodes per move (bounding both latency and memory).
+        self.horizon = horizon
+        self.max_nodes = max_nodes
+        self.beam_width = beam_width
+        self.max_tile = max_tile
+        self.loss_penalty = loss_penalty
         self.algorithm = {
             'a*': self.astar_algorithm,
             'expectimax': self.expectimax_algorithm,
             'random': self.random_moves
         }[self.mode]
+        self.recorder = None
+        self.expanded = 0
+        self.generated = 0
+
+    def instrument(self, recorder):
+        self.recorder = recorder
 
     def get_move(self, board):
-        return self.algorithm(board)
+        if self.recorder is None:
+            return self.algorithm(board)
+        self.expanded = self.generated = 0
+        self.recorder.begin_move()
+        action = self.algorithm(board)
+        self.recorder.end_move(agent=self.mode, action=action, nodes=self.expanded + self.generated,
+                               max_nodes=self.expanded, children=self.generated)
+        return action
 
     def astar_algorithm(self, board):
         return self.a_star_search(board)
@@ -26,40 +44,75 @@ class AI2048:
     def random_moves(self, board):
         return random.choice(['w', 'a', 's', 'd'])
 
-    def heuristic(self, board):
-        total_sum = max(cell for row in board for cell in row)
-        empty_spaces = max(1 for row in board for cell in row if cell == 0)
-        return -total_sum - empty_spaces
+    def heuristic(self, board, remaining):
+        # Upper bound on the merge score still reachable in `remaining`
+        # moves: a move merges every tile at most once, so it scores at most
+        # the board's tile sum, and each modelled spawn adds a 2 to that sum.
+        total = sum(cell for row in board for cell in row)
+        return sum(total + 2 * k for k in range(remaining))
 
     def possible_moves(self, board):
-        moves = []
-        for move in ['w', 'a', 's', 'd']:
-            new_board = move_board(move, deepcopy(board))
-            if new_board != board:
-                moves.append((move, new_board))
-        return moves
+        return [(move, new_board, score) for move, new_board, score in successors(board)]
 
-    def a_star_search(self, board):
-        frontier = []
-        heapq.heappush(frontier, (0, board, []))
+    def spawn(self, board):
+        # The planner's deterministic model of a spawn: a 2 in the first
+        # empty cell scanning from the bottom-right corner.
+        for i in range(3, -1, -1):
+            for j in range(3, -1, -1):
+                if board[i][j] == 0:
+                    board[i][j] = 2
+                    return board
+        return board
 
+    def a_star_search(self, board):
+        # Best-first search for the move sequence of at most `horizon` moves
+        # with the highest merge score, under the deterministic spawn model.
+        # Nodes are (board, parent, action, depth, g) tuples in one list and
+        # the frontier holds (-f, tie, node) with f = g + heuristic, so the
+        # first goal popped (horizon reached, game over or won) is optimal.
+        # Every move adds one spawned 2 to the tile sum, so a board is only
+        # ever reached at one depth: a board already expanded with at least
+        # the same g is skipped.
+        # When max_nodes have been generated, or with beam_width set (the
+        # frontier is cut to the best beam_width entries), the answer is the
+        # best goal or deepest node found so far.
+        nodes = [(board, None, None, 0, 0)]
+        frontier = [(-self.heuristic(board, self.horizon), 0, 0)]
+        closed = {}
+        best = None
         while frontier:
-            _, current_board, path = heapq.heappop(frontier)
-            if check_game_status(current_board, 2048) != 'PLAY':
-                return path[0] if path else 'w'
-
-            for move, new_board in self.possible_moves(current_board):
-                new_path = path + [move]
-                priority = len(new_path) + self.heuristic(new_board)
-                heapq.heappush(frontier, (priority, new_board, new_path))
-
-        return random.choice(['w', 'a', 's', 'd'])
-
-def move_board(move, board):
-    # Implement the logic for moving the board here
-    new_board = deepcopy(board)
-    return new_board
+            _, _, index = heapq.heappop(frontier)
+            current, _, _, depth, g = nodes[index]
+            status = check_game_status(current, self.max_tile)
+            if depth == self.horizon or status != "PLAY":
+                best = index
+                break
+            key = tuple(map(tuple, current))
+            if closed.get(key, -1) >= g:
+                continue
+            closed[key] = g
+            self.expanded += 1
+            for move, new_board, score in self.possible_moves(current):
+                self.generated += 1
+                child = self.spawn(new_board)
+                child_g = g + score
+                child_f = child_g + self.heuristic(child, self.horizon - depth - 1)
+                if check_game_status(child, self.max_tile) == "LOSE":
+                    child_f = child_g - self.loss_penalty
+                nodes.append((child, index, move, depth + 1, child_g))
+                heapq.heappush(frontier, (-child_f, len(nodes), len(nodes) - 1))
+            if self.beam_width and len(frontier) > self.beam_width:
+                frontier = heapq.nsmallest(self.beam_width, frontier)
+                heapq.heapify(frontier)
+            if len(nodes) >= self.max_nodes:
+                break
 
-def check_game_status(board, difficulty):
-    # Implement the logic for checking the game status here
-    return 'PLAY'
+        if best is None:
+            if len(nodes) == 1:
+                return random.choice(['w', 'a', 's', 'd'])
+            best = max(range(1, len(nodes)), key=lambda k: (nodes[k][3], nodes[k][4]))
+        # Walk up to the root's child on the path: its action is the move.
+        parent = nodes[best][1]
+        while parent is not None and nodes[parent][1] is not None:
+            best, parent = parent, nodes[parent][1]
+        return nodes[best][2] or random.choice(['w', 'a', 's', 'd'])
@@ -0,0 +1,128 @@
+import os
+import random
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from game.bitboard import ACTIONS, pack_board, successors
+from game.spawn import spawn_batch as spawn
+from game.vector_env import successors as batch_successors
+
+POLICIES = ("random", "greedy")
+
+
+def playouts(boards, rng, policy="random", max_moves=None):
+    # Plays every board (a uint64 array) to the end with the given policy and
+    # returns the merge score each playout collected. "greedy" takes the move
+    # with the largest immediate merge score, breaking ties at random.
+    boards = boards.copy()
+    totals = np.zeros(len(boards), dtype=np.int64)
+    alive = np.ones(len(boards), dtype=bool)
+    moves = 0
+    while alive.any() and (max_moves is None or moves < max_moves):
+        index = np.flatnonzero(alive)
+        new_boards, scores = batch_successors(boards[index])
+        masks = new_boards != boards[index, None]
+        playing = masks.any(axis=1)
+        alive[index[~playing]] = False
+        index, new_boards, scores, masks = index[playing], new_boards[playing], scores[playing], masks[playing]
+        if not len(index):
+            break
+        weights = rng.random(masks.shape)
+        if policy == "greedy":
+            weights = weights + scores
+        actions = np.where(masks, weights, -1).argmax(axis=1)
+        rows = np.arange(len(index))
+        totals[index] += scores[rows, actions]
+        boards[index] = spawn(new_boards[rows, actions], rng)
+        moves += 1
+    return totals
+
+
+def _playout_stats(afterstates, count, seed, policy, max_moves):
+    # count playouts from every afterstate: (sum, sum of squares) per state.
+    rng = np.random.default_rng(seed)
+    boards = np.repeat(np.array(afterstates, dtype=np.uint64), count)
+    totals = playouts(spawn(boards, rng), rng, policy, max_moves).reshape(len(afterstates), count)
+    totals = totals.astype(np.float64)
+    return totals.sum(axis=1), (totals ** 2).sum(axis=1)
+
+
+class MonteCarloAgent:
+    # Scores each legal move by the mean merge score of playouts started
+    # from its afterstate. Playouts run in numpy batches of batch_size per
+    # move; with workers set the batches of a round are spread over a
+    # process pool (workers=-1 uses every core) that lives as long as the
+    # agent (see close()).
+    #
+    # Rounds continue until every move has had `playouts` playouts or the
+    # time_budget (seconds per move) runs out. After each round the search
+    # stops early if the best move's value (merge score plus playout mean)
+    # exceeds every other move's by more than `confidence` standard errors
+    # on both sides.
+    def __init__(self, playouts=200, policy="random", time_budget=None, batch_size=50, workers=0,
+                 confidence=2.58, max_playout_moves=None, seed=None):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.playouts = playouts
+        self.policy = policy
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+        self.workers = os.cpu_count() if workers < 0 else workers
+        self.confidence = confidence
+        self.max_playout_moves = max_playout_moves
+        self.rng = random.Random(seed)
+        self.executor = None
+        self.last_playouts = 0
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def get_move(self, board):
+        legal = successors(pack_board(board))
+        if len(legal) <= 1:
+            return legal[0][0] if legal else random.choice(ACTIONS)
+        actions = [action for action, _, _ in legal]
+        afterstates = [new_board for _, new_board, _ in legal]
+        immediate = np.array([score for _, _, score in legal], dtype=np.float64)
+
+        count = np.zeros(len(legal))
+        total = np.zeros(len(legal))
+        squares = np.zeros(len(legal))
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        while count[0] < self.playouts:
+            for sums, sums_squared, n in self.run_round(afterstates, min(self.batch_size, self.playouts - int(count[0]))):
+                total += sums
+                squares += sums_squared
+                count += n
+            if self.dominant(count, total, squares, immediate) or (deadline is not None and time.perf_counter() > deadline):
+                break
+        self.last_playouts = int(count.sum())
+        return actions[int(np.argmax(immediate + total / count))]
+
+    def run_round(self, afterstates, size):
+        if not self.workers:
+            return [(*_playout_stats(afterstates, size, self.rng.getrandbits(63), self.policy,
+                                     self.max_playout_moves), size)]
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        chunk = -(-size // self.workers)
+        futures = []
+        for start in range(0, size, chunk):
+            n = min(chunk, size - start)
+            futures.append((self.executor.submit(_playout_stats, afterstates, n, self.rng.getrandbits(63),
+                                                 self.policy, self.max_playout_moves), n))
+        return [(*future.result(), n) for future, n in futures]
+
+    def dominant(self, count, total, squares, immediate):
+        # Compares moves by the value get_move plays, immediate + mean; the
+        # immediate merge score is exact, so the error is the mean's.
+        if count[0] < 2:
+            return False
+        mean = total / count
+        error = np.sqrt(np.maximum(squares / count - mean ** 2, 0) / (count - 1))
+        value = immediate + mean
+        best = int(np.argmax(value))
+        others = np.delete(np.arange(len(value)), best)
+        return bool(value[best] - self.confidence * error[best] > (value[others] + self.confidence * error[others]).max())
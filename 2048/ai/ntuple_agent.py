@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from game.bitboard import pack_board, successors, symmetry
+from game.spawn import fill_two_or_four
+
+# Cells are numbered 4 * row + column. "4x6" is the four 6-tuple network of
+# Jaskowski (2016); "4x4" is a much smaller set of rows and squares.
+TUPLE_SETS = {
+    "4x4": [[0, 1, 2, 3], [4, 5, 6, 7], [0, 1, 4, 5], [4, 5, 8, 9]],
+    "4x6": [[0, 1, 2, 3, 4, 5], [4, 5, 6, 7, 8, 9], [0, 1, 2, 4, 5, 6], [4, 5, 6, 8, 9, 10]],
+}
+
+
+def _symmetric_cells(index):
+    # Where each cell ends up under bitboard.symmetry(board, index).
+    cells = []
+    for cell in range(16):
+        image = symmetry(1 << (4 * cell), index)
+        cells.append((image.bit_length() - 1) // 4)
+    return cells
+
+
+SYMMETRIC_CELLS = [_symmetric_cells(index) for index in range(8)]
+
+
+class NTupleNetwork:
+    # V(board) = sum over tuples and the 8 symmetric images of each tuple of
+    # weights[tuple][exponents of the tuple's cells]. Weights are flat
+    # float32 arrays of 16**len(tuple) entries, all views into one buffer so
+    # the whole network can live in shared memory.
+    def __init__(self, tuples="4x4", buffer=None):
+        self.tuples = TUPLE_SETS[tuples] if isinstance(tuples, str) else [list(t) for t in tuples]
+        self.sizes = [16 ** len(t) for t in self.tuples]
+        if buffer is None:
+            buffer = np.zeros(sum(self.sizes), dtype=np.float32)
+        self.buffer = buffer
+        self.weights = []
+        offset = 0
+        for size in self.sizes:
+            self.weights.append(buffer[offset:offset + size])
+            offset += size
+        # Scalar reads and writes go through memoryviews, which are much
+        # cheaper to index from Python than ndarrays.
+        self.views = [memoryview(w) for w in self.weights]
+        self.shifts = [[[4 * cells[c] for c in t] for cells in SYMMETRIC_CELLS] for t in self.tuples]
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes
+
+    def features(self, board):
+        for view, shifts in zip(self.views, self.shifts):
+            for cell_shifts in shifts:
+                index = 0
+                for k, shift in enumerate(cell_shifts):
+                    index |= ((board >> shift) & 0xF) << (4 * k)
+                yield view, index
+
+    def evaluate(self, board):
+        return sum(view[index] for view, index in self.features(board))
+
+    def evaluate_board(self, board):
+        return self.evaluate(pack_board(board))
+
+    def update(self, board, delta):
+        # Spreads delta over every feature of board (8 symmetries x tuples).
+        step = delta / (8 * len(self.tuples))
+        for view, index in self.features(board):
+            view[index] += step
+
+    def save(self, path):
+        np.savez(path, tuples=np.array(self.tuples), weights=self.buffer)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["tuples"].tolist(), np.array(data["weights"], dtype=np.float32))
+
+
+def best_afterstate(network, board):
+    # Greedy TD afterstate policy: the move maximising reward + V(afterstate).
+    best = None
+    for action, afterstate, reward in successors(board):
+        value = reward + network.evaluate(afterstate)
+        if best is None or value > best[0]:
+            best = (value, action, afterstate, reward)
+    return best
+
+
+def train_game(network, rng, alpha=0.0025):
+    # One game of TD(0) afterstate learning; returns the final tile sum.
+    board = fill_two_or_four(0, iter=2, rng=rng)
+    previous = None
+    while True:
+        best = best_afterstate(network, board)
+        if best is None:
+            break
+        _, _, afterstate, reward = best
+        if previous is not None:
+            network.update(previous, alpha * (reward + network.evaluate(afterstate) - network.evaluate(previous)))
+        previous = afterstate
+        board = fill_two_or_four(afterstate, rng=rng)
+    if previous is not None:
+        network.update(previous, -alpha * network.evaluate(previous))
+    return sum(1 << ((board >> shift) & 0xF) for shift in range(0, 64, 4) if (board >> shift) & 0xF)
+
+
+def train(network, num_games, seed=0, alpha=0.0025):
+    rng = random.Random(seed)
+    return [train_game(network, rng, alpha) for _ in range(num_games)]
+
+
+_worker_network = None
+
+
+def _attach(name, tuples):
+    global _worker_network
+    memory = shared_memory.SharedMemory(name=name)
+    sizes = sum(16 ** len(t) for t in tuples)
+    _worker_network = NTupleNetwork(tuples, np.ndarray((sizes,), dtype=np.float32, buffer=memory.buf))
+    _worker_network.memory = memory
+
+
+def _train_chunk(num_games, seed, alpha):
+    return train(_worker_network, num_games, seed, alpha)
+
+
+def train_parallel(network, num_games, workers=None, seed=0, alpha=0.0025, chunk=50):
+    # Lock-free (Hogwild-style) training: every worker plays its own seeded
+    # games and updates one weight buffer in shared memory. Updates touch few
+    # entries each, so lost writes are rare and harmless to TD learning.
+    memory = shared_memory.SharedMemory(create=True, size=network.nbytes)
+    try:
+        shared = np.ndarray(network.buffer.shape, dtype=np.float32, buffer=memory.buf)
+        shared[:] = network.buffer
+        chunks = [(min(chunk, num_games - start), seed + start, alpha) for start in range(0, num_games, chunk)]
+        scores = []
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_attach,
+                                 initargs=(memory.name, network.tuples)) as executor:
+            for chunk_scores in executor.map(_train_chunk, *zip(*chunks)):
+                scores.extend(chunk_scores)
+        network.buffer[:] = shared
+        del shared
+        return scores
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+class NTupleAgent:
+    def __init__(self, weights_path=None, tuples="4x4"):
+        self.network = NTupleNetwork.load(weights_path) if weights_path else NTupleNetwork(tuples)
+
+    def get_move(self, board):
+        best = best_afterstate(self.network, pack_board(board))
+        return best[1] if best else "w"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train an n-tuple network by TD(0) afterstate learning.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--tuples", choices=sorted(TUPLE_SETS), default="4x4")
+    parser.add_argument("--weights", help="resume from these weights")
+    parser.add_argument("--out", default="ntuple.npz")
+    parser.add_argument("--alpha", type=float, default=0.0025)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    network = NTupleNetwork.load(args.weights) if args.weights else NTupleNetwork(args.tuples)
+    if args.workers > 1:
+        scores = train_parallel(network, args.games, args.workers, args.seed, args.alpha)
+    else:
+        scores = train(network, args.games, args.seed, args.alpha)
+    network.save(args.out)
+    tail = scores[-max(1, len(scores) // 10):]
+    print(json.dumps({"games": len(scores), "mean_score_last_10pct": sum(tail) / len(tail), "weights": args.out}))
+
+
+if __name__ == "__main__":
+    main()
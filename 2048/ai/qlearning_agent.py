@@ -1,15 +1,36 @@
+import os
 import random
+import numpy as np
+from game.bitboard import pack_board, canonical, SYMMETRY_ACTIONS, INVERSE_SYMMETRY_ACTIONS
+from .qtable import QTable
 
 class QLearningAgent:
-    def __init__(self, actions, alpha=0.1, gamma=0.9, epsilon=0.1):
-        self.q_table = {}
+    def __init__(self, actions, alpha=0.1, gamma=0.9, epsilon=0.1, symmetric=False, table_path=None,
+                 max_states=None, shared=False):
+        # States are packed boards; with symmetric they are reduced to the
+        # canonical one of their 8 rotations/reflections. A table_path is
+        # loaded on start (if it exists) and written by save(); shared maps
+        # it read-only so several processes can play from one table, and
+        # such an agent does not learn.
         self.actions = actions
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
+        self.symmetric = symmetric
+        self.table_path = table_path
+        self.shared = shared
+        if table_path and os.path.exists(table_path):
+            self.q_table = QTable.load(table_path, writable=not shared, max_states=max_states)
+        else:
+            self.q_table = QTable(max_states)
 
     def get_state(self, board):
-        return str(board)
+        return self.packed_state(pack_board(board))
+
+    def packed_state(self, packed):
+        if self.symmetric:
+            return canonical(packed)
+        return packed, 0
 
     def choose_action(self, state):
         if random.uniform(0, 1) < self.epsilon:
@@ -18,22 +39,38 @@ class QLearningAgent:
             return self.get_best_action(state)
 
     def get_best_action(self, state):
-        state_actions = self.q_table.get(state, {})
-        return max(state_actions, key=state_actions.get, default=random.choice(self.actions))
+        key, symmetry = state
+        row = self.q_table.row(key)
+        if row is None or np.isnan(row).all():
+            return random.choice(self.actions)
+        best = self.actions[int(np.nanargmax(row))]
+        return INVERSE_SYMMETRY_ACTIONS[symmetry][best]
 
     def learn(self, state, action, reward, next_state):
-        state_actions = self.q_table.setdefault(state, {})
-        next_state_actions = self.q_table.setdefault(next_state, {})
-        best_next_action = max(next_state_actions, key=next_state_actions.get, default=None)
-        
-        target = reward + self.gamma * next_state_actions.get(best_next_action, 0)
-        state_actions[action] = state_actions.get(action, 0) + self.alpha * (target - state_actions.get(action, 0))
+        if self.shared:
+            return
+        (key, symmetry), (next_key, _) = state, next_state
+        row = self.q_table.row(key, create=True)
+        if row is None:
+            return
+        next_row = self.q_table.row(next_key)
+        best_next = 0.0
+        if next_row is not None and not np.isnan(next_row).all():
+            best_next = float(np.nanmax(next_row))
+
+        index = self.actions.index(SYMMETRY_ACTIONS[symmetry][action])
+        current = 0.0 if np.isnan(row[index]) else float(row[index])
+        target = reward + self.gamma * best_next
+        row[index] = current + self.alpha * (target - current)
 
     def update(self, state, action, reward, next_state):
         self.learn(state, action, reward, next_state)
-        state_actions = self.q_table.setdefault(state, {})
-        next_state_actions = self.q_table.setdefault(next_state, {})
-        best_next_action = max(next_state_actions, key=next_state_actions.get, default=random.choice(self.actions))
-        self.q_table[state][action] = state_actions.get(action, 0) + self.alpha * (
-            reward + self.gamma * next_state_actions.get(best_next_action, 0) - state_actions.get(action, 0)
-        )
+
+    def learn_batch(self, batch):
+        # Learns from a batch of recorded moves (see game.records.iter_batches).
+        for board, action, reward, next_board in zip(batch["boards"].tolist(), batch["actions"].tolist(),
+                                                      batch["rewards"].tolist(), batch["next_boards"].tolist()):
+            self.learn(self.packed_state(board), self.actions[action], reward, self.packed_state(next_board))
+
+    def save(self, path=None):
+        return self.q_table.save(path or self.table_path)
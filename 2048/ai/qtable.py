@@ -0,0 +1,79 @@
+import os
+import numpy as np
+
+# File layout: 8-byte magic, uint64 state count n, then n sorted uint64 packed
+# boards followed by an (n, 4) float32 array of Q-values. Untried actions
+# hold NaN, so they are told apart from actions whose value is 0.
+MAGIC = b"Q2048v1\0"
+HEADER_BYTES = 16
+NUM_ACTIONS = 4
+
+
+class QTable:
+    # Q-values keyed by 64-bit packed boards, one float32 row per state.
+    #
+    # States loaded from a file stay memory-mapped (read-only unless opened
+    # with writable=True, in which case updates go straight to the file) and
+    # are found by binary search; states first seen in this process live in
+    # a growable array indexed through a dict. max_states bounds how many new
+    # states are added.
+    def __init__(self, max_states=None):
+        self.max_states = max_states
+        self.base_keys = np.zeros(0, dtype=np.uint64)
+        self.base_values = np.zeros((0, NUM_ACTIONS), dtype=np.float32)
+        self.index = {}
+        self.values = np.full((1024, NUM_ACTIONS), np.nan, dtype=np.float32)
+        self.path = None
+
+    def __len__(self):
+        return len(self.base_keys) + len(self.index)
+
+    @classmethod
+    def load(cls, path, writable=False, max_states=None):
+        table = cls(max_states)
+        with open(path, "rb") as f:
+            header = f.read(HEADER_BYTES)
+        if header[:8] != MAGIC:
+            raise ValueError(f"{path} is not a Q-table file")
+        count = int(np.frombuffer(header[8:], dtype=np.uint64)[0])
+        if count:
+            mode = "r+" if writable else "r"
+            table.base_keys = np.memmap(path, dtype=np.uint64, mode=mode, offset=HEADER_BYTES, shape=(count,))
+            table.base_values = np.memmap(path, dtype=np.float32, mode=mode, offset=HEADER_BYTES + 8 * count,
+                                          shape=(count, NUM_ACTIONS))
+        table.path = path
+        return table
+
+    def row(self, key, create=False):
+        # The Q-value row of a state as a writable view, or None when the
+        # state is unknown and create is False (or the table is full).
+        slot = self.index.get(key)
+        if slot is not None:
+            return self.values[slot]
+        if len(self.base_keys):
+            position = int(np.searchsorted(self.base_keys, np.uint64(key)))
+            if position < len(self.base_keys) and int(self.base_keys[position]) == key:
+                return self.base_values[position]
+        if not create or (self.max_states is not None and len(self) >= self.max_states):
+            return None
+        slot = len(self.index)
+        if slot == len(self.values):
+            grown = np.full((2 * len(self.values), NUM_ACTIONS), np.nan, dtype=np.float32)
+            grown[:slot] = self.values
+            self.values = grown
+        self.index[key] = slot
+        return self.values[slot]
+
+    def save(self, path=None):
+        path = path or self.path
+        keys = np.concatenate([np.asarray(self.base_keys), np.fromiter(self.index, dtype=np.uint64, count=len(self.index))])
+        values = np.concatenate([np.asarray(self.base_values), self.values[:len(self.index)]])
+        order = np.argsort(keys)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.uint64(len(keys)).tobytes())
+            f.write(keys[order].tobytes())
+            f.write(values[order].astype(np.float32).tobytes())
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,99 @@
+import argparse
+import json
+import statistics
+import time
+from copy import deepcopy
+from game import bitboard
+from game.engine import play_headless
+from game.expectimax_agent import ExpectimaxAgent, INF
+from game.logic import move, check_game_status
+from .corpus import board_corpus
+
+
+class LegacyExpectimaxAgent(ExpectimaxAgent):
+    # The original search: chance nodes sum prob * value over every empty
+    # cell without normalising and apply alpha-beta cutoffs.
+    def search_root(self, board, depth, order=None):
+        board = bitboard.unpack_board(board)
+        scores = {}
+        for action in self.actions:
+            simBoard = move(action, deepcopy(board))
+            if simBoard != board:
+                scores[action] = self.legacy_expectimax(simBoard, depth, -INF, INF, False)
+        return max(scores, key=scores.get) if scores else None, scores
+
+    def legacy_expectimax(self, board, depth, alpha, beta, is_maximizing):
+        self.nodes += 1
+        status = check_game_status(board)
+        if status != "PLAY" or depth == 0:
+            return self.evaluate_board(board)
+
+        if is_maximizing:
+            max_value = -INF
+            for action in self.actions:
+                new_board = move(action, deepcopy(board))
+                if new_board != board:
+                    value = self.legacy_expectimax(new_board, depth - 1, alpha, beta, False)
+                    max_value = max(max_value, value)
+                    alpha = max(alpha, value)
+                    if beta <= alpha:
+                        break
+            return max_value
+        else:
+            empty_tiles = [(i, j) for i in range(4) for j in range(4) if board[i][j] == 0]
+            if not empty_tiles:
+                return self.evaluate_board(board)
+
+            value = 0
+            for tile in empty_tiles:
+                for new_tile in [2, 4]:
+                    new_board = deepcopy(board)
+                    new_board[tile[0]][tile[1]] = new_tile
+                    prob = 0.9 if new_tile == 2 else 0.1
+                    value += prob * self.legacy_expectimax(new_board, depth - 1, alpha, beta, True)
+                    beta = min(beta, value)
+                    if beta <= alpha:
+                        break
+            return value
+
+
+CONFIGS = {
+    "legacy": lambda depth: LegacyExpectimaxAgent(depth=depth, batch_leaves=False),
+    "exact": lambda depth: ExpectimaxAgent(depth=depth, prob_cutoff=0),
+    "cutoff": lambda depth: ExpectimaxAgent(depth=depth),
+    "cutoff+sample4": lambda depth: ExpectimaxAgent(depth=depth, sample_cells=4, seed=0),
+}
+
+
+def measure(make_agent, boards, depth):
+    agent = make_agent(depth)
+    nodes, times = [], []
+    for board in boards:
+        start = time.perf_counter()
+        agent.getNextBestMoveExpectiminimax(bitboard.unpack_board(board))
+        times.append(time.perf_counter() - start)
+        nodes.append(agent.nodes)
+    return {"nodes_per_move": statistics.mean(nodes), "ms_per_move": 1000 * statistics.mean(times)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare chance-node models: nodes searched, speed and scores.")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--positions", type=int, default=50)
+    parser.add_argument("--games", type=int, default=5)
+    parser.add_argument("--max-tile", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    boards = board_corpus(args.positions, args.seed)
+    for name, make_agent in CONFIGS.items():
+        report = {"config": name, "depth": args.depth}
+        report.update(measure(make_agent, boards, args.depth))
+        scores = [play_headless("expectimax", args.seed + i, args.max_tile, agent=make_agent(args.depth))["score"]
+                  for i in range(args.games)]
+        report["mean_score"] = statistics.mean(scores) if scores else None
+        print(json.dumps(report), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import random
+from game import bitboard
+
+# The corpus must not change when the game's spawn model does, or results
+# of different commits would be measured on different boards. Its spawns
+# are therefore pinned here: a uniformly drawn empty cell gets a 2 or a 4
+# with equal odds, except the opening tiles, which are 2s.
+_OPENING_BOARDS = frozenset([0] + [1 << shift for shift in range(0, 64, 4)])
+
+
+def _spawn(board, rng, iter=1):
+    for _ in range(iter):
+        shift = rng.choice(bitboard.empty_cells(board))
+        exponent = 1 if board in _OPENING_BOARDS else rng.choice((1, 2))
+        board |= exponent << shift
+    return board
+
+
+def board_corpus(count, seed=0, min_moves=10, max_moves=150):
+    # Packed boards reached by random play from seeded games, so every run
+    # of a benchmark sees exactly the same positions.
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = _spawn(0, rng, iter=2)
+        stop = rng.randint(min_moves, max_moves)
+        for _ in range(stop):
+            moves = [new for new in (bitboard.move(a, board) for a in bitboard.ACTIONS) if new != board]
+            if not moves:
+                break
+            board = _spawn(rng.choice(moves), rng)
+        if bitboard.check_game_status(board) == "PLAY":
+            boards.append(board)
+    return boards
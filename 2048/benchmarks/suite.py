@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from game import bitboard, logic
+from game.expectimax_agent import ExpectimaxAgent, HEURISTICS, evaluate_board
+from game.tournament import percentile
+from .corpus import board_corpus
+
+# Every metric is stored as {"value": ..., "higher_is_better": ...}, so two
+# result files can be compared without knowing what each metric measures.
+DEPTHS = (2, 3, 4, 5)
+# Positions searched per depth; deeper searches get fewer so a run stays
+# within a few minutes.
+DEPTH_POSITIONS = {2: 40, 3: 20, 4: 8, 5: 3}
+DEFAULT_THRESHOLD = 0.10
+# Code timed in a fresh interpreter by bench_startup: an empty interpreter
+# for reference, importing the headless engine alone, and main.py up to the
+# point where it draws the menu (on SDL's dummy video driver).
+STARTUP = {
+    "python": "pass",
+    "import_engine": "import game.engine",
+    "main": "import main, game.game as g; g.init_display(120 + g.load_constants()['size'])",
+}
+
+
+def best_rate(function, items, repeat, copy=None):
+    # Items processed per second in the fastest of `repeat` passes. copy, if
+    # given, prepares a fresh item for every call outside the timed loop.
+    # Every pass starts from a cold successor cache.
+    best = None
+    for _ in range(repeat):
+        batch = [copy(item) for item in items] if copy else items
+        bitboard.successors.cache_clear()
+        start = time.perf_counter()
+        for item in batch:
+            function(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def bench_moves(boards, repeat):
+    metrics = {}
+    for direction in bitboard.ACTIONS:
+        # logic.move works in place, so each pass gets fresh copies.
+        metrics[f"logic.move/{direction}/moves_per_s"] = best_rate(
+            lambda b: logic.move(direction, b), boards, repeat, copy=lambda b: [row[:] for row in b])
+        packed = [bitboard.pack_board(board) for board in boards]
+        metrics[f"bitboard.move/{direction}/moves_per_s"] = best_rate(lambda b: bitboard.move(direction, b), packed, repeat)
+    return {name: {"value": value, "higher_is_better": True} for name, value in metrics.items()}
+
+
+def bench_heuristics(boards, repeat):
+    metrics = {}
+    for name, heuristic in HEURISTICS.items():
+        metrics[f"heuristic/{name}/evals_per_s"] = best_rate(heuristic, boards, repeat)
+    metrics["heuristic/evaluate_board/evals_per_s"] = best_rate(evaluate_board, boards, repeat)
+    return {name: {"value": value, "higher_is_better": True} for name, value in metrics.items()}
+
+
+def bench_search(boards, depth, agent_params=None):
+    agent = ExpectimaxAgent(depth=depth, **(agent_params or {}))
+    # A cache left warm by an earlier depth would flatter this one.
+    bitboard.successors.cache_clear()
+    nodes, times = 0, []
+    for board in boards:
+        start = time.perf_counter()
+        agent.getNextBestMoveExpectiminimax(board)
+        times.append(time.perf_counter() - start)
+        nodes += agent.nodes
+    times.sort()
+    prefix = f"expectimax/depth{depth}"
+    return {
+        f"{prefix}/nodes_per_s": {"value": nodes / sum(times), "higher_is_better": True},
+        f"{prefix}/p50_ms": {"value": 1000 * percentile(times, 50), "higher_is_better": False},
+        f"{prefix}/p90_ms": {"value": 1000 * percentile(times, 90), "higher_is_better": False},
+        f"{prefix}/p99_ms": {"value": 1000 * percentile(times, 99), "higher_is_better": False},
+        f"{prefix}/max_ms": {"value": 1000 * times[-1], "higher_is_better": False},
+    }
+
+
+def bench_startup(repeat):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    metrics = {}
+    for name, code in STARTUP.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=root, env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        metrics[f"startup/{name}/ms"] = {"value": 1000 * best, "higher_is_better": False}
+    return metrics
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(seed=0, positions=1000, depths=DEPTHS, repeat=5, scale=1.0, agent_params=None):
+    # Runs every benchmark on corpora drawn from `seed`; scale shrinks or
+    # grows the number of searched positions per depth.
+    boards = [bitboard.unpack_board(board) for board in board_corpus(positions, seed)]
+    metrics = {}
+    metrics.update(bench_moves(boards, repeat))
+    metrics.update(bench_heuristics(boards, repeat))
+    metrics.update(bench_startup(repeat))
+    for depth in depths:
+        count = max(1, round(scale * DEPTH_POSITIONS.get(depth, 2)))
+        metrics.update(bench_search(boards[:count], depth, agent_params))
+    return {
+        "meta": {"commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "seed": seed,
+                 "positions": positions, "depths": list(depths), "scale": scale, "agent_params": agent_params or {},
+                 "python": platform.python_version(), "machine": platform.machine()},
+        "metrics": metrics,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    # Relative change of every metric present in both results, oriented so
+    # that a positive change is an improvement. Changes worse than
+    # -threshold are regressions.
+    rows = []
+    for name, metric in current["metrics"].items():
+        if name not in baseline["metrics"]:
+            continue
+        before, after = baseline["metrics"][name]["value"], metric["value"]
+        if not before:
+            continue
+        change = (after - before) / before
+        if not metric["higher_is_better"]:
+            change = -change
+        rows.append({"metric": name, "baseline": before, "current": after, "change": change,
+                     "regression": change < -threshold})
+    return rows
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine, heuristics and expectimax search.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the suite and write the results as JSON")
+    run_parser.add_argument("--out", help="results file (default: print to stdout)")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--positions", type=int, default=1000)
+    run_parser.add_argument("--depth", type=int, action="append", help="search depth to time (repeatable)")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--scale", type=float, default=1.0, help="multiplier on positions searched per depth")
+    run_parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                            help="ExpectimaxAgent parameter, value parsed as JSON")
+    run_parser.add_argument("--baseline", help="compare against this results file")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    startup_parser = commands.add_parser("startup", help="only time interpreter, engine and main.py startup")
+    startup_parser.add_argument("--repeat", type=int, default=5)
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        print(json.dumps(bench_startup(args.repeat), indent=2))
+        return 0
+    if args.command == "run":
+        agent_params = {}
+        for param in args.param:
+            key, _, value = param.partition("=")
+            agent_params[key] = json.loads(value)
+        results = run(args.seed, args.positions, args.depth or DEPTHS, args.repeat, args.scale, agent_params)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+        if not args.baseline:
+            return 0
+        baseline, threshold = load(args.baseline), args.threshold
+    else:
+        baseline, results, threshold = load(args.baseline), load(args.current), args.threshold
+
+    rows = compare(baseline, results, threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:45} {row['baseline']:14.3f} {row['current']:14.3f} {100 * row['change']:+7.1f}% {flag}",
+              file=sys.stderr if args.command == "run" and not args.out else sys.stdout)
+    regressions = sum(row["regression"] for row in rows)
+    if regressions:
+        print(f"{regressions} regression(s) beyond {100 * threshold:.0f}%", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
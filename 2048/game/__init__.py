@@ -1,3 +1,17 @@
-from .game import play_game, run_games
+import importlib
 from .logic import move, check_game_status, fill_two_or_four
-from .ui import Button, draw_round_rect, show_menu
\ No newline at end of file
+
+# The pygame front end is only imported on first use, so the headless engine
+# (game.engine, game.bitboard) can be imported without opening a window.
+_UI_EXPORTS = {
+    "play_game": ".game",
+    "run_games": ".game",
+    "Button": ".ui",
+    "draw_round_rect": ".ui",
+    "show_menu": ".ui",
+}
+
+def __getattr__(name):
+    if name in _UI_EXPORTS:
+        return getattr(importlib.import_module(_UI_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
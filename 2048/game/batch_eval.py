@@ -0,0 +1,109 @@
+import numpy as np
+from .expectimax_agent import EVAL_WEIGHTS, SNAKE_WEIGHTS, evaluate_board
+
+_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+_SNAKE = np.array(SNAKE_WEIGHTS, dtype=np.int64)
+
+
+def smoothness_terms():
+    # Replays the loops of smoothness_heuristic, recording every
+    # (cell, cell, coefficient) it subtracts, including the wrap-around
+    # edge terms produced by its negative indices.
+    terms = []
+
+    def diff(a, b, coefficient):
+        terms.append((a[0] % 4 * 4 + a[1] % 4, b[0] % 4 * 4 + b[1] % 4, coefficient))
+
+    for i in range(4):
+        for j in range(3):
+            diff((i, j), (i, j + 1), 1)
+            diff((j, i), (j + 1, i), 1)
+            if i == 0 or i == 3 or j == 0 or j == 3:
+                diff((i, j), (i - 1, j), 0.5)
+                diff((i, j), (i, j - 1), 0.5)
+                if i == 0 and j == 0:
+                    diff((i, j), (i + 1, j), 0.5)
+                    diff((i, j), (i, j + 1), 0.5)
+                elif i == 0 and j == 3:
+                    diff((i, j), (i + 1, j), 0.5)
+                    diff((i, j), (i, j - 1), 0.5)
+                elif i == 3 and j == 0:
+                    diff((i, j), (i - 1, j), 0.5)
+                    diff((i, j), (i, j + 1), 0.5)
+                elif i == 3 and j == 3:
+                    diff((i, j), (i - 1, j), 0.5)
+                    diff((i, j), (i, j - 1), 0.5)
+    first, second, coefficients = zip(*terms)
+    return np.array(first), np.array(second), np.array(coefficients)
+
+
+_SMOOTH_A, _SMOOTH_B, _SMOOTH_COEF = smoothness_terms()
+
+
+def to_values(boards):
+    # Accepts an (N, 4, 4) array of tile values or an (N,) array of packed
+    # bitboards and returns an (N, 4, 4) int64 array of tile values.
+    boards = np.asarray(boards)
+    if boards.ndim == 3:
+        return boards.astype(np.int64, copy=False)
+    exponents = (boards.astype(np.uint64)[:, None] >> _SHIFTS) & np.uint64(0xF)
+    values = np.where(exponents > 0, np.left_shift(1, exponents.astype(np.int64)), 0)
+    return values.reshape(-1, 4, 4)
+
+
+def snake(values):
+    return (values * _SNAKE).sum(axis=(1, 2))
+
+
+def monotonicity(values):
+    rows_up = (values[:, :, :-1] <= values[:, :, 1:]).sum(axis=(1, 2))
+    rows_down = (values[:, :, :-1] >= values[:, :, 1:]).sum(axis=(1, 2))
+    cols_up = (values[:, :-1, :] <= values[:, 1:, :]).sum(axis=(1, 2))
+    cols_down = (values[:, :-1, :] >= values[:, 1:, :]).sum(axis=(1, 2))
+    return np.maximum(rows_up, rows_down) + np.maximum(cols_up, cols_down)
+
+
+def smoothness(values):
+    flat = values.reshape(-1, 16)
+    return -(np.abs(flat[:, _SMOOTH_A] - flat[:, _SMOOTH_B]) * _SMOOTH_COEF).sum(axis=1)
+
+
+def empty_tiles(values):
+    return (values == 0).sum(axis=(1, 2))
+
+
+def merge_potential(values):
+    rows = np.where(values[:, :, :-1] == values[:, :, 1:], values[:, :, :-1], 0).sum(axis=(1, 2))
+    cols = np.where(values[:, :-1, :] == values[:, 1:, :], values[:, :-1, :], 0).sum(axis=(1, 2))
+    return rows + cols
+
+
+BATCH_HEURISTICS = {
+    "snake": snake,
+    "monotonicity": monotonicity,
+    "smoothness": smoothness,
+    "empty_tiles": empty_tiles,
+    "merge_potential": merge_potential,
+}
+
+
+def evaluate_boards(boards, weights=EVAL_WEIGHTS):
+    # Scores a whole frontier in one call. Terms are added in the same order
+    # as evaluate_board and zero-weight terms are skipped, so every score is
+    # bit-for-bit equal to the scalar evaluation.
+    values = to_values(boards)
+    scores = np.zeros(len(values))
+    for name, heuristic in BATCH_HEURISTICS.items():
+        if weights[name]:
+            scores += weights[name] * heuristic(values)
+    return scores
+
+
+def check_against_scalar(boards, weights=EVAL_WEIGHTS):
+    values = to_values(boards)
+    batch = evaluate_boards(values, weights)
+    for board, score in zip(values.tolist(), batch.tolist()):
+        expected = evaluate_board(board, weights)
+        if score != expected:
+            raise AssertionError(f"batch score {score} != scalar score {expected} for {board}")
+    return len(batch)
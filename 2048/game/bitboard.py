@@ -0,0 +1,287 @@
+import marshal
+import os
+from functools import lru_cache
+
+# A board is packed into one 64-bit int: row i lives in bits 16*i..16*i+15 and
+# cell (i, j) is the nibble at bits 16*i+4*j. Each nibble holds the tile
+# exponent (0 for an empty cell, k for a tile of value 2**k).
+
+ACTIONS = ("w", "a", "s", "d")
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15
+SUCCESSOR_CACHE_SIZE = 1 << 16
+# Precomputed tables (these and game.heuristic_tables) are cached here.
+TABLE_DIR = os.environ.get("AI2048_TABLE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "tables"))
+# Bump when _build_tables changes, so a stale cache is never loaded.
+TABLE_VERSION = 1
+
+ROW_LEFT = [0] * 65536
+ROW_RIGHT = [0] * 65536
+SCORE_LEFT = [0] * 65536
+SCORE_RIGHT = [0] * 65536
+ROW_EMPTY = [0] * 65536
+ROW_MAX = [0] * 65536
+ROW_REVERSE = [0] * 65536
+# Spreads the four nibbles of a row down a column, one nibble per row.
+ROW_TO_COL = [0] * 65536
+
+
+def _slide_left(cells):
+    tiles = [cell for cell in cells if cell]
+    merged, score, i = [], 0, 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            exponent = min(tiles[i] + 1, MAX_EXPONENT)
+            merged.append(exponent)
+            score += 1 << exponent
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+    merged.extend([0] * (4 - len(merged)))
+    return merged, score
+
+
+def _pack_row(cells):
+    return cells[0] | (cells[1] << 4) | (cells[2] << 8) | (cells[3] << 12)
+
+
+def _build_tables():
+    for row in range(65536):
+        cells = [(row >> 4 * j) & 0xF for j in range(4)]
+        merged, score = _slide_left(cells)
+        ROW_LEFT[row] = _pack_row(merged)
+        SCORE_LEFT[row] = score
+        ROW_EMPTY[row] = cells.count(0)
+        ROW_MAX[row] = max(cells)
+        ROW_REVERSE[row] = _pack_row(cells[::-1])
+        ROW_TO_COL[row] = cells[0] | (cells[1] << 16) | (cells[2] << 32) | (cells[3] << 48)
+    for row in range(65536):
+        reverse = ROW_REVERSE[row]
+        ROW_RIGHT[row] = ROW_REVERSE[ROW_LEFT[reverse]]
+        SCORE_RIGHT[row] = SCORE_LEFT[reverse]
+
+
+_TABLES = (ROW_LEFT, ROW_RIGHT, SCORE_LEFT, SCORE_RIGHT, ROW_EMPTY, ROW_MAX, ROW_REVERSE, ROW_TO_COL)
+
+
+def _load_tables():
+    # Building the tables takes a few hundred milliseconds of every import,
+    # so they are cached (marshal loads them in a tenth of that) and only
+    # rebuilt when the cache is missing or unreadable.
+    path = os.path.join(TABLE_DIR, f"bitboard-v{TABLE_VERSION}-{MAX_EXPONENT}.marshal")
+    try:
+        with open(path, "rb") as f:
+            tables = marshal.loads(f.read())
+        if len(tables) == len(_TABLES) and all(len(table) == 65536 for table in tables):
+            for target, table in zip(_TABLES, tables):
+                target[:] = table
+            return
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    _build_tables()
+    try:
+        os.makedirs(TABLE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            marshal.dump(list(_TABLES), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+_load_tables()
+
+
+def pack_board(board):
+    packed = 0
+    for i in range(4):
+        for j in range(4):
+            if board[i][j]:
+                packed |= (board[i][j].bit_length() - 1) << (16 * i + 4 * j)
+    return packed
+
+
+def unpack_board(packed):
+    board = []
+    for i in range(4):
+        row = []
+        for j in range(4):
+            exponent = (packed >> (16 * i + 4 * j)) & 0xF
+            row.append(1 << exponent if exponent else 0)
+        board.append(row)
+    return board
+
+
+def transpose(board):
+    return (ROW_TO_COL[board & ROW_MASK] |
+            ROW_TO_COL[(board >> 16) & ROW_MASK] << 4 |
+            ROW_TO_COL[(board >> 32) & ROW_MASK] << 8 |
+            ROW_TO_COL[(board >> 48) & ROW_MASK] << 12)
+
+
+def mirror_rows(board):
+    # Reverses every row (left-right mirror).
+    return (ROW_REVERSE[board & ROW_MASK] |
+            ROW_REVERSE[(board >> 16) & ROW_MASK] << 16 |
+            ROW_REVERSE[(board >> 32) & ROW_MASK] << 32 |
+            ROW_REVERSE[(board >> 48) & ROW_MASK] << 48)
+
+
+def mirror_cols(board):
+    # Reverses the order of the rows (top-bottom mirror).
+    return ((board >> 48) | ((board >> 16) & 0xFFFF0000) |
+            ((board << 16) & 0xFFFF00000000) | ((board << 48) & 0xFFFF000000000000))
+
+
+# The 8 symmetries of the square, indexed by bits: 4 = transpose, then
+# 1 = mirror rows, then 2 = mirror columns. SYMMETRY_ACTIONS[i] maps each
+# action on a board to the equivalent action on symmetry(board, i).
+_ACTION_SWAPS = {4: {"w": "a", "a": "w", "s": "d", "d": "s"}, 1: {"a": "d", "d": "a"}, 2: {"w": "s", "s": "w"}}
+
+
+def _symmetry_actions(index):
+    mapping = {}
+    for action in ACTIONS:
+        mapped = action
+        for bit in (4, 1, 2):
+            if index & bit:
+                mapped = _ACTION_SWAPS[bit].get(mapped, mapped)
+        mapping[action] = mapped
+    return mapping
+
+
+SYMMETRY_ACTIONS = [_symmetry_actions(index) for index in range(8)]
+INVERSE_SYMMETRY_ACTIONS = [{v: k for k, v in mapping.items()} for mapping in SYMMETRY_ACTIONS]
+
+
+def symmetry(board, index):
+    if index & 4:
+        board = transpose(board)
+    if index & 1:
+        board = mirror_rows(board)
+    if index & 2:
+        board = mirror_cols(board)
+    return board
+
+
+def canonical(board):
+    # The smallest of the 8 symmetric images of board, and the index of the
+    # symmetry that produces it.
+    best, best_index = board, 0
+    for index in range(1, 8):
+        image = symmetry(board, index)
+        if image < best:
+            best, best_index = image, index
+    return best, best_index
+
+
+def move_left(board):
+    return (ROW_LEFT[board & ROW_MASK] |
+            ROW_LEFT[(board >> 16) & ROW_MASK] << 16 |
+            ROW_LEFT[(board >> 32) & ROW_MASK] << 32 |
+            ROW_LEFT[(board >> 48) & ROW_MASK] << 48)
+
+
+def move_right(board):
+    return (ROW_RIGHT[board & ROW_MASK] |
+            ROW_RIGHT[(board >> 16) & ROW_MASK] << 16 |
+            ROW_RIGHT[(board >> 32) & ROW_MASK] << 32 |
+            ROW_RIGHT[(board >> 48) & ROW_MASK] << 48)
+
+
+def move_up(board):
+    cols = transpose(board)
+    return (ROW_TO_COL[ROW_LEFT[cols & ROW_MASK]] |
+            ROW_TO_COL[ROW_LEFT[(cols >> 16) & ROW_MASK]] << 4 |
+            ROW_TO_COL[ROW_LEFT[(cols >> 32) & ROW_MASK]] << 8 |
+            ROW_TO_COL[ROW_LEFT[(cols >> 48) & ROW_MASK]] << 12)
+
+
+def move_down(board):
+    cols = transpose(board)
+    return (ROW_TO_COL[ROW_RIGHT[cols & ROW_MASK]] |
+            ROW_TO_COL[ROW_RIGHT[(cols >> 16) & ROW_MASK]] << 4 |
+            ROW_TO_COL[ROW_RIGHT[(cols >> 32) & ROW_MASK]] << 8 |
+            ROW_TO_COL[ROW_RIGHT[(cols >> 48) & ROW_MASK]] << 12)
+
+
+def move(direction, board):
+    if direction == "w":
+        return move_up(board)
+    if direction == "s":
+        return move_down(board)
+    if direction == "a":
+        return move_left(board)
+    if direction == "d":
+        return move_right(board)
+
+
+@lru_cache(maxsize=SUCCESSOR_CACHE_SIZE)
+def successors(board):
+    # Every legal move from board as (action, new_board, merge_score), in
+    # ACTIONS order. Rows and columns are read once and shared by the four
+    # directions; results are memoised in a bounded LRU cache.
+    rows = (board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48)
+    cols = transpose(board)
+    cols = (cols & ROW_MASK, (cols >> 16) & ROW_MASK, (cols >> 32) & ROW_MASK, cols >> 48)
+    result = []
+    up = (ROW_TO_COL[ROW_LEFT[cols[0]]] | ROW_TO_COL[ROW_LEFT[cols[1]]] << 4 |
+          ROW_TO_COL[ROW_LEFT[cols[2]]] << 8 | ROW_TO_COL[ROW_LEFT[cols[3]]] << 12)
+    if up != board:
+        result.append(("w", up, SCORE_LEFT[cols[0]] + SCORE_LEFT[cols[1]] + SCORE_LEFT[cols[2]] + SCORE_LEFT[cols[3]]))
+    left = ROW_LEFT[rows[0]] | ROW_LEFT[rows[1]] << 16 | ROW_LEFT[rows[2]] << 32 | ROW_LEFT[rows[3]] << 48
+    if left != board:
+        result.append(("a", left, SCORE_LEFT[rows[0]] + SCORE_LEFT[rows[1]] + SCORE_LEFT[rows[2]] + SCORE_LEFT[rows[3]]))
+    down = (ROW_TO_COL[ROW_RIGHT[cols[0]]] | ROW_TO_COL[ROW_RIGHT[cols[1]]] << 4 |
+            ROW_TO_COL[ROW_RIGHT[cols[2]]] << 8 | ROW_TO_COL[ROW_RIGHT[cols[3]]] << 12)
+    if down != board:
+        result.append(("s", down, SCORE_RIGHT[cols[0]] + SCORE_RIGHT[cols[1]] + SCORE_RIGHT[cols[2]] + SCORE_RIGHT[cols[3]]))
+    right = ROW_RIGHT[rows[0]] | ROW_RIGHT[rows[1]] << 16 | ROW_RIGHT[rows[2]] << 32 | ROW_RIGHT[rows[3]] << 48
+    if right != board:
+        result.append(("d", right, SCORE_RIGHT[rows[0]] + SCORE_RIGHT[rows[1]] + SCORE_RIGHT[rows[2]] + SCORE_RIGHT[rows[3]]))
+    return tuple(result)
+
+
+def count_empty(board):
+    return (ROW_EMPTY[board & ROW_MASK] + ROW_EMPTY[(board >> 16) & ROW_MASK] +
+            ROW_EMPTY[(board >> 32) & ROW_MASK] + ROW_EMPTY[(board >> 48) & ROW_MASK])
+
+
+def empty_cells(board):
+    return [shift for shift in range(0, 64, 4) if not (board >> shift) & 0xF]
+
+
+def max_exponent(board):
+    return max(ROW_MAX[board & ROW_MASK], ROW_MAX[(board >> 16) & ROW_MASK],
+               ROW_MAX[(board >> 32) & ROW_MASK], ROW_MAX[(board >> 48) & ROW_MASK])
+
+
+def max_tile(board):
+    exponent = max_exponent(board)
+    return 1 << exponent if exponent else 0
+
+
+def _can_slide(lines):
+    for shift in (0, 16, 32, 48):
+        line = (lines >> shift) & ROW_MASK
+        if ROW_LEFT[line] != line or ROW_RIGHT[line] != line:
+            return True
+    return False
+
+
+def check_game_status(board, max_tile=2048):
+    if max_exponent(board) >= max_tile.bit_length() - 1:
+        return "WIN"
+    if count_empty(board) or _can_slide(board) or _can_slide(transpose(board)):
+        return "PLAY"
+    return "LOSE"
+
+
+def __getattr__(name):
+    # fill_two_or_four now lives in game.spawn (which imports this module);
+    # it is still reachable from here for existing callers.
+    if name == "fill_two_or_four":
+        from .spawn import fill_two_or_four
+        return fill_two_or_four
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,170 @@
+import random
+import statistics
+import time
+from . import bitboard
+from .expectimax_agent import ExpectimaxAgent
+from .spawn import SPAWN_PROBABILITIES, SpawnEngine
+
+AI_MODES = ("a*", "expectimax", "random", "qlearning", "ntuple", "montecarlo")
+
+
+def make_agent(ai_mode, **params):
+    # Agents are imported here, so importing the engine loads neither numpy
+    # nor the agents a run does not use.
+    if ai_mode == "expectimax" and params.get("workers"):
+        from .parallel_search import ParallelExpectimaxAgent
+        return ParallelExpectimaxAgent(**params)
+    if ai_mode == "expectimax":
+        return ExpectimaxAgent(**params)
+    if ai_mode == "qlearning":
+        from ai.qlearning_agent import QLearningAgent
+        return QLearningAgent(actions=list(bitboard.ACTIONS), **params)
+    if ai_mode == "ntuple":
+        from ai.ntuple_agent import NTupleAgent
+        return NTupleAgent(**params)
+    if ai_mode == "montecarlo":
+        from ai.monte_carlo_agent import MonteCarloAgent
+        return MonteCarloAgent(**params)
+    from ai.ai_agent import AI2048
+    return AI2048(ai_mode, **params)
+
+
+def tile_sum(board):
+    return sum(sum(row) for row in board)
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": 1000 * statistics.mean(ordered),
+        "p50_ms": 1000 * ordered[len(ordered) // 2],
+        "p95_ms": 1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "max_ms": 1000 * ordered[-1],
+    }
+
+
+def play_headless(ai_mode="expectimax", seed=None, max_tile=2048, agent_params=None, observer=None,
+                  time_budget=None, agent=None, recorder=None, writer=None, spawn_probabilities=SPAWN_PROBABILITIES,
+                  cancel=None):
+    # The seed drives both tile spawns (a game.spawn.SpawnEngine of its own)
+    # and the agents' use of `random`, so (ai_mode, seed, agent_params)
+    # always replays the same game. An expectimax agent built here models
+    # chance nodes with the same spawn_probabilities as the game. A game
+    # running longer than time_budget seconds stops with status "TIMEOUT",
+    # and one whose cancel event (threading or multiprocessing) is set stops
+    # before its next move with status "CANCELLED".
+    # A prebuilt agent of the ai_mode's kind can be passed instead of params.
+    # With a SearchRecorder every move is recorded and the result carries the
+    # game's aggregated search report. With a game.records.RecordWriter the
+    # game is streamed to its record file.
+    if seed is None:
+        seed = random.randrange(2**32)
+    random.seed(seed)
+    spawner = SpawnEngine(seed, spawn_probabilities)
+    if agent is None:
+        agent_params = dict(agent_params or {})
+        if ai_mode == "expectimax":
+            agent_params.setdefault("spawn_probabilities", spawn_probabilities)
+        agent = make_agent(ai_mode, **agent_params)
+    instrumented = recorder is not None and hasattr(agent, "instrument")
+    if recorder is not None:
+        recorder.new_game(seed)
+        if instrumented:
+            agent.instrument(recorder)
+
+    packed = spawner.new_board()
+    board = bitboard.unpack_board(packed)
+    if observer is not None:
+        observer.on_start(board)
+    # Observers may also define before_move(board), called before the agent
+    # is asked for a move.
+    before_move = getattr(observer, "before_move", None)
+
+    if writer is not None:
+        writer.begin_game(seed, packed)
+    status = bitboard.check_game_status(packed, max_tile)
+    latencies = []
+    moves = 0
+    merge_score = 0
+    start = time.perf_counter()
+    while status == "PLAY":
+        tick = time.perf_counter()
+        if time_budget is not None and tick - start > time_budget:
+            status = "TIMEOUT"
+            break
+        if cancel is not None and cancel.is_set():
+            status = "CANCELLED"
+            break
+        if before_move is not None:
+            before_move(board)
+        if recorder is not None and not instrumented:
+            recorder.begin_move()
+        if ai_mode == "qlearning":
+            state = agent.get_state(board)
+            action = agent.choose_action(state)
+        elif ai_mode == "expectimax":
+            action = agent.getNextBestMoveExpectiminimax(board)
+        else:
+            action = agent.get_move(board)
+        latencies.append(time.perf_counter() - tick)
+        if recorder is not None and not instrumented:
+            recorder.end_move(agent=ai_mode, action=action)
+
+        legal = {move: (new_board, score) for move, new_board, score in bitboard.successors(packed)}
+        if action not in legal:
+            if recorder is not None:
+                recorder.discard_move()
+            continue
+        new_packed, score = legal[action]
+        merge_score += score
+        moves += 1
+        packed = spawner.spawn(new_packed)
+        board = bitboard.unpack_board(packed)
+        if writer is not None:
+            writer.add_move(action, new_packed, packed, getattr(agent, "nodes", 0), latencies[-1],
+                            getattr(agent, "completed_depth", 0))
+        if ai_mode == "qlearning":
+            agent.update(state, action, score, agent.get_state(board))
+        status = bitboard.check_game_status(packed, max_tile)
+        if observer is not None:
+            observer.on_move(board, action)
+
+    if writer is not None:
+        writer.end_game(status)
+    if observer is not None:
+        observer.on_end(board, status)
+    if ai_mode == "qlearning" and agent.table_path and not agent.shared:
+        agent.save()
+    result = {
+        "agent": ai_mode,
+        "seed": seed,
+        "status": status,
+        "score": tile_sum(board),
+        "merge_score": merge_score,
+        "max_tile": bitboard.max_tile(packed),
+        "moves": moves,
+        "time_s": time.perf_counter() - start,
+    }
+    result.update(latency_summary(latencies))
+    if getattr(agent, "tt", None) is not None:
+        result["tt"] = agent.tt.stats()
+    if getattr(agent, "position_db", None) is not None:
+        result["position_db"] = agent.position_db.stats()
+    if recorder is not None:
+        result["search"] = recorder.report()
+    # Agents holding worker pools release them between games.
+    if hasattr(agent, "close"):
+        agent.close()
+    return result
+
+
+def game_seeds(num_games, seed=0, seeds=None):
+    return list(seeds) if seeds is not None else [seed + i for i in range(num_games)]
+
+
+def run_headless(num_games, ai_mode="expectimax", seed=0, max_tile=2048, agent_params=None, seeds=None,
+                 time_budget=None, recorder=None, writer=None):
+    return [play_headless(ai_mode, s, max_tile, agent_params, time_budget=time_budget, recorder=recorder, writer=writer)
+            for s in game_seeds(num_games, seed, seeds)]
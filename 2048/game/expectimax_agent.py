@@ -1,20 +1,25 @@
-from copy import deepcopy
-import numpy as np
 import random
-from .logic import move, fill_two_or_four, check_game_status
+import time
+from .bitboard import pack_board, unpack_board, successors, empty_cells, max_exponent
+from .spawn import SPAWN_PROBABILITIES, spawn_exponents
+from .transposition import TranspositionTable
 
 
 INF = 2**64
+SPAWN_EXPONENTS = spawn_exponents(SPAWN_PROBABILITIES)
+WIN_EXPONENT = 11
 PERFECT_BOARD = [[2, 2**2, 2**3, 2**4],
                 [2**8, 2**7, 2**6, 2**5],
                 [2**9, 2**10, 2**11, 2**12],
                 [2**16, 2**15, 2**14, 2**13]]
 
+SNAKE_WEIGHTS = [[65536, 32768, 16384, 8192],
+                 [256, 512, 1024, 2048],
+                 [128, 64, 32, 16],
+                 [2, 4, 8, 1]]
+
 def improved_snake_heuristic(board):
-    weights = [[65536, 32768, 16384, 8192],
-               [256, 512, 1024, 2048],
-               [128, 64, 32, 16],
-               [2, 4, 8, 1]]
+    weights = SNAKE_WEIGHTS
     return sum(board[i][j] * weights[i][j] for i in range(4) for j in range(4))
 
 def monotonicity_heuristic(board):
@@ -69,99 +74,334 @@ def merge_potential_heuristic(board):
             if i < 3 and board[i][j] == board[i + 1][j]:
                 merge_score += board[i][j]
     return merge_score
+
+# Terms of evaluate_board in the order they are summed.
+HEURISTICS = {
+    "snake": improved_snake_heuristic,
+    "monotonicity": monotonicity_heuristic,
+    "smoothness": smoothness_heuristic,
+    "empty_tiles": empty_tiles_heuristic,
+    "merge_potential": merge_potential_heuristic,
+}
+EVAL_WEIGHTS = {
+    "snake": 0.30,
+    "monotonicity": 0.50,
+    "smoothness": 0.50,
+    "empty_tiles": 0.1,
+    "merge_potential": 0,
+}
+
+def evaluate_board(board, weights=EVAL_WEIGHTS):
+    value = 0
+    for name, heuristic in HEURISTICS.items():
+        if weights[name]:
+            value += weights[name] * heuristic(board)
+    return value
+
+class SearchTimeout(Exception):
+    pass
+
 class ExpectimaxAgent:
-    def __init__(self, depth=4):
+    def __init__(self, depth=4, tt_size=0, tt_policy="lru", persist_tt=False, weights=None, batch_leaves=True,
+                 use_tables=False, time_budget=None, max_depth=8, adaptive_depth=False, prob_cutoff=1e-4,
+                 sample_cells=None, seed=None, evaluator=None, incremental=False, debug_incremental=False,
+                 position_db=None, db_min_depth=0, spawn_probabilities=SPAWN_PROBABILITIES):
         self.depth = depth
+        # Chance-node children whose probability of being reached from the
+        # root falls below prob_cutoff are scored as leaves. sample_cells
+        # caps how many empty cells a chance node expands.
+        self.prob_cutoff = prob_cutoff
+        self.sample_cells = sample_cells
+        self.rng = random.Random(seed)
+        # Chance nodes weight spawns like game.spawn draws them.
+        self.spawn_exponents = spawn_exponents(spawn_probabilities)
+        self.reset_counters()
+        self.recorder = None
+        self.successors = successors
+        # With a time_budget (seconds per move) the agent deepens iteratively
+        # up to max_depth and plays the best move of the deepest completed
+        # iteration, or of an unfinished deeper one that has already scored
+        # that move (moves are searched best first). adaptive_depth lowers the depth on open boards, where
+        # chance nodes branch widely, and raises it on crowded ones.
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.adaptive_depth = adaptive_depth
+        self.deadline = None
+        self.completed_depth = 0
+        self.truncated = False
         self.actions = ["w", "a", "s", "d"]
+        self.weights = dict(EVAL_WEIGHTS, **(weights or {}))
+        # tt_size is the transposition table capacity in entries (0 disables
+        # it). With persist_tt the table is kept between moves of a game.
+        self.tt = TranspositionTable(tt_size, tt_policy) if tt_size else None
+        self.persist_tt = persist_tt
+        # With batch_leaves, nodes one ply above the horizon score all their
+        # children in a single vectorized call (see game.batch_eval).
+        self.evaluate_boards = None
+        self._np = None
+        if batch_leaves and not use_tables:
+            import numpy as np
+            from .batch_eval import evaluate_boards
+            self.evaluate_boards = evaluate_boards
+            self._np = np
+        # With use_tables, boards are scored by per-line lookups into tables
+        # precomputed for these weights (see game.heuristic_tables).
+        self.tables = None
+        if use_tables:
+            from .heuristic_tables import HeuristicTables
+            self.tables = HeuristicTables(self.weights)
+        # evaluator replaces the heuristic: any object with evaluate(packed)
+        # and evaluate_board(board), such as a trained ai.ntuple_agent
+        # network, or the path of saved n-tuple weights.
+        self.evaluator = evaluator
+        if isinstance(evaluator, str):
+            from ai.ntuple_agent import NTupleNetwork
+            self.evaluator = NTupleNetwork.load(evaluator)
+        if self.evaluator is not None:
+            self.evaluate_boards = None
+            self.tables = None
+        # position_db (a game.position_db.PositionDB or the path of one) is
+        # consulted before every search; a stored position searched to at
+        # least db_min_depth is played without searching.
+        self.position_db = position_db
+        self.db_min_depth = db_min_depth
+        if isinstance(position_db, str):
+            from .position_db import PositionDB
+            self.position_db = PositionDB.load(position_db)
+        # With incremental, per-line partial sums of the heuristic are passed
+        # down the tree and only the lines a move or spawn changed are
+        # rescored (see game.incremental_eval); debug_incremental checks
+        # every leaf against a full evaluation.
+        self.incremental = None
+        if (incremental or debug_incremental) and self.evaluator is None:
+            from .incremental_eval import IncrementalEvaluator
+            self.incremental = IncrementalEvaluator(self.weights, debug=debug_incremental)
+            self.evaluate_boards = None
+            self.tables = None
+
+    def reset_counters(self):
+        self.nodes = 0
+        self.max_nodes = 0
+        self.chance_nodes = 0
+        self.leaf_evals = 0
+        self.children = 0
+
+    def instrument(self, recorder):
+        # Routes move generation and evaluation through the recorder's
+        # timers; without this the search only bumps integer counters.
+        self.recorder = recorder
+        self.successors = recorder.timed(successors, "movegen_s")
+        self.evaluate_packed = recorder.timed(self.evaluate_packed, "heuristic_s")
+        self.evaluate_partials = recorder.timed(self.evaluate_partials, "heuristic_s")
+        if self.evaluate_boards is not None:
+            self.evaluate_boards = recorder.timed(self.evaluate_boards, "heuristic_s")
 
     def getNextBestMoveExpectiminimax(self, board):
+        if self.tt is not None and not self.persist_tt:
+            self.tt.clear()
+        self.reset_counters()
+        if self.recorder is None:
+            return self.choose_move(board)
+
+        tt_hits, tt_misses = (self.tt.hits, self.tt.misses) if self.tt is not None else (0, 0)
+        self.recorder.begin_move()
+        action = self.choose_move(board)
+        self.recorder.end_move(
+            agent="expectimax", action=action, depth=self.completed_depth, nodes=self.nodes,
+            max_nodes=self.max_nodes, chance_nodes=self.chance_nodes, leaf_evals=self.leaf_evals,
+            children=self.children,
+            tt_hits=self.tt.hits - tt_hits if self.tt is not None else 0,
+            tt_misses=self.tt.misses - tt_misses if self.tt is not None else 0)
+        return action
+
+    def choose_move(self, board):
+        if self.position_db is not None:
+            stored = self.position_db.lookup(pack_board(board), self.db_min_depth)
+            if stored is not None:
+                self.completed_depth = stored[1]
+                return stored[0]
+        if self.time_budget is not None:
+            return self.iterative_deepening(board)
+        depth = self.depth_for(board, self.depth) if self.adaptive_depth else self.depth
+        self.completed_depth = depth
+        return self.search_root(pack_board(board), depth)[0]
+
+    def depth_for(self, board, depth):
+        empty = sum(row.count(0) for row in board)
+        if empty >= 8:
+            return max(1, depth - 1)
+        if empty <= 3:
+            return depth + 1
+        return depth
+
+    def search_root(self, board, depth, order=None, scores=None):
+        # Root moves are searched in order (default self.actions); each score
+        # is added to scores as soon as it is known, so a caller passing the
+        # dict keeps the moves finished before a SearchTimeout.
+        children = {action: new_board for action, new_board, _ in self.successors(board)}
+        partials = self.incremental.full(board) if self.incremental is not None else None
+        scores = {} if scores is None else scores
+        for action in order or self.actions:
+            if action in children:
+                child_partials = self.incremental.update(partials, children[action]) if partials else None
+                scores[action] = self.expectimax(children[action], depth, False, partials=child_partials)
+        return self.best_action(scores), scores
+
+    def best_action(self, scores):
         bestScore = -INF
         bestNextMove = None
         for action in self.actions:
-            simBoard = move(action, deepcopy(board))
-            if simBoard != board:
-                value = self.expectimax(simBoard, self.depth, -INF, INF, False)
-                if value > bestScore:
-                    bestScore = value
-                    bestNextMove = action
+            if action in scores and scores[action] > bestScore:
+                bestScore = scores[action]
+                bestNextMove = action
         return bestNextMove
 
-    def expectimax(self, board, depth, alpha, beta, is_maximizing):
-        status = check_game_status(board)
-        if status != "PLAY" or depth == 0:
-            return self.evaluate_board(board)
+    def iterative_deepening(self, board):
+        start = time.perf_counter()
+        self.deadline = start + self.time_budget
+        max_depth = self.depth_for(board, self.max_depth) if self.adaptive_depth else self.max_depth
+        best_move, order = None, None
+        self.completed_depth = 0
+        previous_elapsed = None
+        packed = pack_board(board)
+        partial = {}
+        try:
+            for depth in range(1, max_depth + 1):
+                iteration_start = time.perf_counter()
+                partial = {}
+                best_move, scores = self.search_root(packed, depth, order, partial)
+                self.completed_depth = depth
+                if len(scores) <= 1:
+                    break
+                # The next iteration searches the best moves first, so when it
+                # times out it has scored the current best move at the deeper
+                # depth before the others (see below).
+                order = sorted(scores, key=scores.get, reverse=True)
+
+                # Skip an iteration that cannot finish in the remaining time,
+                # assuming it grows by the same factor as the last one did.
+                now = time.perf_counter()
+                elapsed = now - iteration_start
+                growth = elapsed / previous_elapsed if previous_elapsed else 4
+                previous_elapsed = max(elapsed, 1e-6)
+                if now + elapsed * max(growth, 1) > self.deadline:
+                    break
+        except SearchTimeout:
+            # Moves the unfinished iteration scored are compared at its depth:
+            # once the previous best is among them, the best of them is the
+            # better choice (the unscored ones ranked lower one ply shallower).
+            if order and order[0] in partial:
+                best_move = self.best_action(partial)
+        finally:
+            self.deadline = None
+        if best_move is None:
+            for action, _, _ in successors(packed):
+                return action
+        return best_move
+
+    def expectimax(self, board, depth, is_maximizing, prob=1.0, partials=None):
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if self.tt is None:
+            return self.search(board, depth, is_maximizing, prob, partials)
+
+        value = self.tt.get(board, depth, is_maximizing)
+        if value is not None:
+            return value
+        # The table is keyed without prob, so only values of subtrees that
+        # prob_cutoff did not cut short are stored: those are the same on
+        # every path to the board.
+        truncated, self.truncated = self.truncated, False
+        value = self.search(board, depth, is_maximizing, prob, partials)
+        if not self.truncated:
+            self.tt.store(board, depth, is_maximizing, value)
+        self.truncated = truncated or self.truncated
+        return value
+
+    def search(self, board, depth, is_maximizing, prob, partials=None):
+        # Boards are packed bitboards here; a won board, the horizon and
+        # improbable nodes are scored as leaves. partials carries the
+        # incremental evaluator's line sums for board, if it is enabled.
+        if depth == 0 or max_exponent(board) >= WIN_EXPONENT:
+            return self.evaluate_leaf(board, partials)
+        if prob < self.prob_cutoff:
+            self.truncated = True
+            return self.evaluate_leaf(board, partials)
 
         if is_maximizing:
-            max_value = -INF
-            for action in self.actions:
-                new_board = move(action, deepcopy(board))
-                if new_board != board:
-                    value = self.expectimax(new_board, depth - 1, alpha, beta, False)
-                    max_value = max(max_value, value)
-                    alpha = max(alpha, value)
-                    if beta <= alpha:
-                        break  # Beta cutoff
-            return max_value
+            children = [new_board for _, new_board, _ in self.successors(board)]
+            if not children:
+                return self.evaluate_leaf(board, partials)
+            self.max_nodes += 1
+            self.children += len(children)
+            leaf_values = self.leaf_values(children, depth)
+            if leaf_values is not None:
+                return max(leaf_values)
+            if partials is not None:
+                update = self.incremental.update
+                return max(self.expectimax(new_board, depth - 1, False, prob, update(partials, new_board))
+                           for new_board in children)
+            return max(self.expectimax(new_board, depth - 1, False, prob) for new_board in children)
         else:
-            empty_tiles = [(i, j) for i in range(4) for j in range(4) if board[i][j] == 0]
+            empty_tiles = empty_cells(board)
             if not empty_tiles:
-                return self.evaluate_board(board)
+                return self.evaluate_leaf(board, partials)
+            # On open boards only a random subset of the empty cells is
+            # expanded; the average over that subset estimates the full one.
+            if self.sample_cells and len(empty_tiles) > self.sample_cells:
+                empty_tiles = self.rng.sample(empty_tiles, self.sample_cells)
+
+            spawns = self.spawn_exponents
+            children = [board | (exponent << shift) for shift in empty_tiles for exponent, _ in spawns]
+            self.chance_nodes += 1
+            self.children += len(children)
+            leaf_values = self.leaf_values(children, depth)
 
+            # Each spawn happens with probability P(value) / len(empty_tiles).
             value = 0
-            for tile in empty_tiles:
-                for new_tile in [2, 4]:
-                    new_board = deepcopy(board)
-                    new_board[tile[0]][tile[1]] = new_tile
-                    prob = 0.9 if new_tile == 2 else 0.1
-                    value += prob * self.expectimax(new_board, depth - 1, alpha, beta, True)
-                    beta = min(beta, value)
-                    if beta <= alpha:
-                        break  # Alpha cutoff
-            return value
+            cell_prob = prob / len(empty_tiles)
+            for index, new_board in enumerate(children):
+                spawn_prob = spawns[index % len(spawns)][1]
+                if leaf_values is not None:
+                    child_value = leaf_values[index]
+                elif partials is not None:
+                    shift = empty_tiles[index // len(spawns)]
+                    child_value = self.expectimax(new_board, depth - 1, True, cell_prob * spawn_prob,
+                                                  self.incremental.spawn(partials, new_board, shift))
+                else:
+                    child_value = self.expectimax(new_board, depth - 1, True, cell_prob * spawn_prob)
+                value += spawn_prob * child_value
+            return value / len(empty_tiles)
 
-    def evaluate_board(self, board):
-        return (0.30 * improved_snake_heuristic(board) +
-                0.50 * monotonicity_heuristic(board) +
-                0.50 * smoothness_heuristic(board) +
-                0.1 * empty_tiles_heuristic(board) +
-                0 * merge_potential_heuristic(board))
-
-    # def evaluate_board(self, board):
-    #  return (.25 * improved_snake_heuristic(board) +
-    #         .25 * monotonicity_heuristic(board) +
-    #         .5 * smoothness_heuristic(board) +
-    #         .0 * empty_tiles_heuristic(board) +
-    #         .0 * merge_potential_heuristic(board))
-
-    # def evaluate_board(self, board):
-     
-    #     max_tile = max(max(row) for row in board)
-        
-    #     # Dynamic weight adjustment based on the highest tile value
-    #     if max_tile >= 1024:
-    #         snake_weight = 0.35
-    #         monotonicity_weight = 0.5
-    #         smoothness_weight = 0.5
-    #         empty_tiles_weight = 0
-    #         merge_potential_weight = 0
-    #     elif max_tile >= 512:
-    #         snake_weight = 0.35
-    #         monotonicity_weight = 0.5
-    #         smoothness_weight = 0.5
-    #         empty_tiles_weight = 0
-    #         merge_potential_weight = 0
-    #     else:
-    #         snake_weight = 0.5
-    #         monotonicity_weight = 0.25
-    #         smoothness_weight = 0.25
-    #         empty_tiles_weight = 0
-    #         merge_potential_weight = 0
-        
-    #     return (snake_weight * improved_snake_heuristic(board) +
-    #             monotonicity_weight * monotonicity_heuristic(board) +
-    #             smoothness_weight * smoothness_heuristic(board) +
-    #             empty_tiles_weight * empty_tiles_heuristic(board) +
-    #             merge_potential_weight * merge_potential_heuristic(board))
-    
+    def leaf_values(self, children, depth):
+        if depth != 1 or self.evaluate_boards is None or not children:
+            return None
+        self.nodes += len(children)
+        self.leaf_evals += len(children)
+        np = self._np
+        return self.evaluate_boards(np.array(children, dtype=np.uint64), self.weights).tolist()
+
+    def evaluate_leaf(self, board, partials):
+        if partials is None:
+            return self.evaluate_packed(board)
+        return self.evaluate_partials(board, partials)
 
+    def evaluate_partials(self, board, partials):
+        self.leaf_evals += 1
+        return self.incremental.value(partials, board)
 
+    def evaluate_packed(self, board):
+        self.leaf_evals += 1
+        if self.evaluator is not None:
+            return self.evaluator.evaluate(board)
+        if self.tables is not None:
+            return self.tables.evaluate(board)
+        return self.evaluate_board(unpack_board(board))
+
+    def evaluate_board(self, board):
+        if self.evaluator is not None:
+            return self.evaluator.evaluate_board(board)
+        if self.tables is not None:
+            return self.tables.evaluate(pack_board(board))
+        return evaluate_board(board, self.weights)
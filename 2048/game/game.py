@@ -1,22 +1,45 @@
 import json
+import os
 import sys
 import time
-from copy import deepcopy
 import pygame
 from pygame.locals import *
 from .logic import *
-from ai.ai_agent import AI2048
-from ai.qlearning_agent import QLearningAgent
-from .expectimax_agent import ExpectimaxAgent
-
-pygame.init()
-c = json.load(open("constants.json", "r"))
-screen = pygame.display.set_mode((c["size"], c["size"]))
-my_font = pygame.font.SysFont(c["font"], c["font_size"], bold=True)
+from .engine import play_headless
+from .renderer import BoardRenderer
+
+CONSTANTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "constants.json")
 WHITE = (255, 255, 255)
 
+# Set up by init_display() on first use, so importing this module neither
+# initializes pygame nor opens a window.
+c = None
+screen = None
+my_font = None
+renderer = None
+
+def load_constants():
+    global c
+    if c is None:
+        with open(CONSTANTS_PATH) as f:
+            c = json.load(f)
+    return c
+
+def init_display(width=None):
+    global screen, my_font, renderer
+    if screen is None:
+        load_constants()
+        pygame.init()
+        screen = pygame.display.set_mode((width or c["size"], c["size"]))
+        my_font = pygame.font.SysFont(c["font"], c["font_size"], bold=True)
+        renderer = BoardRenderer(screen, c, my_font, c.get("fps", 60))
+    return screen, my_font
+
 def win_check(board, status, theme, text_col):
     if status != "PLAY":
+        init_display()
+        renderer.flush()
+        renderer.invalidate()
         size = c["size"]
         s = pygame.Surface((size, size), pygame.SRCALPHA)
         s.fill(c["colour"][theme]["over"])
@@ -31,6 +54,7 @@ def win_check(board, status, theme, text_col):
 def new_game(theme, text_col):
     board = [[0] * 4 for _ in range(4)]
     display(board, theme)
+    renderer.invalidate()
 
     screen.blit(my_font.render("NEW GAME!", 1, text_col), (130, 225))
     pygame.display.update()
@@ -41,6 +65,8 @@ def new_game(theme, text_col):
     return board
 
 def restart(board, theme, text_col):
+    init_display()
+    renderer.invalidate()
     s = pygame.Surface((c["size"], c["size"]), pygame.SRCALPHA)
     s.fill(c["colour"][theme]["over"])
     screen.blit(s, (0, 0))
@@ -58,70 +84,45 @@ def restart(board, theme, text_col):
                 board = new_game(theme, text_col)
                 return board
 
-def display(board, theme):
-    screen.fill(tuple(c["colour"][theme]["background"]))
-    box = c["size"] // 4
-    padding = c["padding"]
-    for i in range(4):
-        for j in range(4):
-            colour = tuple(c["colour"][theme][str(board[i][j])])
-            pygame.draw.rect(screen, colour, (j * box + padding, i * box + padding, box - 2 * padding, box - 2 * padding), 0)
-            if board[i][j] != 0:
-                text_colour = tuple(c["colour"][theme]["dark"]) if board[i][j] in (2, 4) else tuple(c["colour"][theme]["light"])
-                screen.blit(my_font.render("{:>4}".format(board[i][j]), 1, text_colour), (j * box + 2.5 * padding, i * box + 7 * padding))
-    pygame.display.update()
+def display(board, theme, force=True):
+    init_display()
+    renderer.draw(board, theme, force)
+
+class PygameObserver:
+    def __init__(self, theme, text_col):
+        init_display()
+        self.theme = theme
+        self.text_col = text_col
+
+    def on_start(self, board):
+        display([[0] * 4 for _ in range(4)], self.theme)
+        renderer.invalidate()
+        screen.blit(my_font.render("NEW GAME!", 1, self.text_col), (130, 225))
+        pygame.display.update()
+        time.sleep(1)
+        display(board, self.theme)
+
+    def before_move(self, board):
+        renderer.begin_wait()
+
+    def on_move(self, board, action):
+        # Frame-limited: boards arriving faster than the renderer's fps are
+        # coalesced instead of slowing the agent down.
+        renderer.end_wait()
+        display(board, self.theme, force=False)
+        pygame.event.pump()
+
+    def on_end(self, board, status):
+        win_check(board, status, self.theme, self.text_col)
+
+def play_game(theme, difficulty, ai_mode, seed=None, agent_params=None, recorder=None):
+    text_col = tuple(load_constants()["colour"][theme]["dark"]) if theme == "light" else WHITE
+    observer = PygameObserver(theme, text_col)
+    return play_headless(ai_mode, seed, difficulty, agent_params, observer, recorder=recorder)
 
-def play_game(theme, difficulty, ai_mode):
-    text_col = tuple(c["colour"][theme]["dark"]) if theme == "light" else WHITE
-    board = new_game(theme, text_col)
-    status = "PLAY"
-    final_score = 0
-
-    if ai_mode == "qlearning":
-        agent = QLearningAgent(actions=["w", "a", "s", "d"])
-        while status == "PLAY":
-            state = agent.get_state(board)
-            action = agent.choose_action(state)
-            new_board = move(action, deepcopy(board))
-            if new_board != board:
-                reward = sum(sum(row) for row in new_board) - sum(sum(row) for row in board)
-                board = fill_two_or_four(new_board)
-                display(board, theme)
-                next_state = agent.get_state(board)
-                agent.update(state, action, reward, next_state)
-                status = check_game_status(board, difficulty)
-                board, status = win_check(board, status, theme, text_col)
-                final_score = sum(sum(row) for row in board)
-            pygame.event.pump()
-    elif ai_mode == "expectimax":
-        ai_agent = ExpectimaxAgent()
-        while status == "PLAY":
-            move_key = ai_agent.getNextBestMoveExpectiminimax(board)
-            new_board = move(move_key, deepcopy(board))
-            if new_board != board:
-                board = fill_two_or_four(new_board)
-                display(board, theme)
-                status = check_game_status(board, difficulty)
-                board, status = win_check(board, status, theme, text_col)
-                final_score = sum(sum(row) for row in board)
-            pygame.event.pump()  
-    else:
-        ai_agent = AI2048(ai_mode)
-        while status == "PLAY":
-            move_key = ai_agent.get_move(board)
-            new_board = move(move_key, deepcopy(board))
-            if new_board != board:
-                board = fill_two_or_four(new_board)
-                display(board, theme)
-                status = check_game_status(board, difficulty)
-                board, status = win_check(board, status, theme, text_col)
-                final_score = sum(sum(row) for row in board)
-            pygame.event.pump()
-    return final_score
-
-def run_games(num_games, theme, difficulty, ai_mode):
-    scores = []
+def run_games(num_games, theme, difficulty, ai_mode, recorder=None):
+    results = []
     for i in range(num_games):
-        score = play_game(theme, difficulty, ai_mode)
-        scores.append(score)
-    return scores
+        result = play_game(theme, difficulty, ai_mode, recorder=recorder)
+        results.append(result)
+    return results
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import numpy as np
+from .batch_eval import smoothness_terms
+from .bitboard import ROW_MASK, TABLE_DIR, transpose
+from .expectimax_agent import EVAL_WEIGHTS, SNAKE_WEIGHTS
+
+# Bump when the table layout or the line decomposition changes, so stale
+# files on disk are never picked up.
+TABLE_VERSION = 1
+
+# Rows of the table array: weighted additive terms for each row position and
+# each column position, then the unweighted monotonicity pair counts.
+ROW_TABLES = range(0, 4)
+COL_TABLES = range(4, 8)
+MONO_UP, MONO_DOWN = 8, 9
+
+
+def weights_key(weights):
+    spec = {"version": TABLE_VERSION, "snake": SNAKE_WEIGHTS,
+            "weights": {name: float(weight) for name, weight in sorted(weights.items())}}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def build_tables(weights=EVAL_WEIGHTS):
+    # Every heuristic term in evaluate_board only looks at cells that share a
+    # row or a column, so it splits into per-line contributions indexed by
+    # the 16-bit line value and the line's position on the board.
+    lines = np.arange(65536)
+    exponents = np.stack([(lines >> 4 * k) & 0xF for k in range(4)], axis=1)
+    values = np.where(exponents > 0, np.left_shift(1, exponents), 0).astype(np.int64)
+
+    row_smooth = np.zeros((4, 65536))
+    col_smooth = np.zeros((4, 65536))
+    for a, b, coefficient in zip(*smoothness_terms()):
+        if a // 4 == b // 4:
+            row_smooth[a // 4] -= coefficient * np.abs(values[:, a % 4] - values[:, b % 4])
+        else:
+            col_smooth[a % 4] -= coefficient * np.abs(values[:, a // 4] - values[:, b // 4])
+
+    merges = np.where(values[:, :-1] == values[:, 1:], values[:, :-1], 0).sum(axis=1)
+    empty = (values == 0).sum(axis=1)
+
+    tables = np.zeros((10, 65536))
+    for i in range(4):
+        if weights["snake"]:
+            tables[ROW_TABLES[i]] += weights["snake"] * (values @ np.array(SNAKE_WEIGHTS[i], dtype=np.int64))
+        if weights["smoothness"]:
+            tables[ROW_TABLES[i]] += weights["smoothness"] * row_smooth[i]
+            tables[COL_TABLES[i]] += weights["smoothness"] * col_smooth[i]
+        if weights["empty_tiles"]:
+            tables[ROW_TABLES[i]] += weights["empty_tiles"] * empty
+        if weights["merge_potential"]:
+            tables[ROW_TABLES[i]] += weights["merge_potential"] * merges
+            tables[COL_TABLES[i]] += weights["merge_potential"] * merges
+    tables[MONO_UP] = (values[:, :-1] <= values[:, 1:]).sum(axis=1)
+    tables[MONO_DOWN] = (values[:, :-1] >= values[:, 1:]).sum(axis=1)
+    return tables
+
+
+def table_path(weights=EVAL_WEIGHTS, directory=None):
+    return os.path.join(directory or TABLE_DIR, f"heuristics-{weights_key(weights)}.npy")
+
+
+def load_tables(weights=EVAL_WEIGHTS, directory=None):
+    # Memory-maps the tables for these weights, building and saving them
+    # first if no file exists for the weights' hash yet.
+    path = table_path(weights, directory)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, build_tables(weights))
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+
+class HeuristicTables:
+    # Evaluates packed boards with 8 line lookups (4 rows, 4 columns) into
+    # the additive tables plus the monotonicity counts of the same lines.
+    # Scores match evaluate_board up to floating point rounding.
+    def __init__(self, weights=EVAL_WEIGHTS, directory=None):
+        self.weights = dict(EVAL_WEIGHTS, **weights)
+        self.tables = load_tables(self.weights, directory)
+        # Scalar lookups go through memoryviews of the mapped file, which
+        # return plain floats and are much cheaper to index than ndarrays.
+        self.rows = [memoryview(self.tables[i]) for i in ROW_TABLES]
+        self.cols = [memoryview(self.tables[i]) for i in COL_TABLES]
+        self.mono_up = memoryview(self.tables[MONO_UP])
+        self.mono_down = memoryview(self.tables[MONO_DOWN])
+        self.mono_weight = self.weights["monotonicity"]
+
+    def evaluate(self, board):
+        cols = transpose(board)
+        r0, r1, r2, r3 = board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48
+        c0, c1, c2, c3 = cols & ROW_MASK, (cols >> 16) & ROW_MASK, (cols >> 32) & ROW_MASK, cols >> 48
+        rows, columns = self.rows, self.cols
+        value = (rows[0][r0] + rows[1][r1] + rows[2][r2] + rows[3][r3] +
+                 columns[0][c0] + columns[1][c1] + columns[2][c2] + columns[3][c3])
+        if self.mono_weight:
+            up, down = self.mono_up, self.mono_down
+            value += self.mono_weight * (
+                max(up[r0] + up[r1] + up[r2] + up[r3], down[r0] + down[r1] + down[r2] + down[r3]) +
+                max(up[c0] + up[c1] + up[c2] + up[c3], down[c0] + down[c1] + down[c2] + down[c3]))
+        return value
+
+    def evaluate_many(self, boards):
+        boards = np.asarray(boards, dtype=np.uint64)
+        rows = [((boards >> np.uint64(16 * i)) & np.uint64(ROW_MASK)).astype(np.int64) for i in range(4)]
+        cols = [((boards >> np.uint64(4 * j)) & np.uint64(0x000F000F000F000F)) for j in range(4)]
+        cols = [(c & np.uint64(0xF) | (c >> np.uint64(12)) & np.uint64(0xF0) |
+                 (c >> np.uint64(24)) & np.uint64(0xF00) | (c >> np.uint64(36)) & np.uint64(0xF000)).astype(np.int64)
+                for c in cols]
+        tables = self.tables
+        value = sum(tables[ROW_TABLES[i]][rows[i]] for i in range(4)) + sum(tables[COL_TABLES[j]][cols[j]] for j in range(4))
+        if self.mono_weight:
+            up, down = tables[MONO_UP], tables[MONO_DOWN]
+            value = value + self.mono_weight * (
+                np.maximum(sum(up[r] for r in rows), sum(down[r] for r in rows)) +
+                np.maximum(sum(up[c] for c in cols), sum(down[c] for c in cols)))
+        return value
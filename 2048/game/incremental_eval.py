@@ -0,0 +1,99 @@
+from .batch_eval import smoothness_terms
+from .bitboard import ROW_MASK, transpose, unpack_board
+from .expectimax_agent import EVAL_WEIGHTS, SNAKE_WEIGHTS, evaluate_board
+
+# Partial sums are kept per line: positions 0-3 are the rows, 4-7 the
+# columns (read top to bottom). Every term of evaluate_board only compares
+# cells of one line, so a board's value is the sum of its lines' additive
+# terms plus the monotonicity maxima over the lines' pair counts.
+
+
+def _line_smoothness():
+    terms = [[] for _ in range(8)]
+    for a, b, coefficient in zip(*smoothness_terms()):
+        a, b, coefficient = int(a), int(b), float(coefficient)
+        if a // 4 == b // 4:
+            terms[a // 4].append((a % 4, b % 4, coefficient))
+        else:
+            terms[4 + a % 4].append((a // 4, b // 4, coefficient))
+    return terms
+
+
+LINE_SMOOTHNESS = _line_smoothness()
+
+
+def board_lines(board):
+    cols = transpose(board)
+    return (board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48,
+            cols & ROW_MASK, (cols >> 16) & ROW_MASK, (cols >> 32) & ROW_MASK, cols >> 48)
+
+
+class IncrementalEvaluator:
+    # Partials are 8-tuples of (line, additive, up, down) entries, one per
+    # line position. update() and spawn() build a child's partials from its
+    # parent's, recomputing only the lines whose 16-bit value changed;
+    # entries are memoised per (position, line). With debug every value()
+    # is checked against a full evaluate_board of the same board.
+    def __init__(self, weights=EVAL_WEIGHTS, debug=False):
+        self.weights = dict(EVAL_WEIGHTS, **weights)
+        self.debug = debug
+        self.cache = {}
+        self.recomputed = 0
+
+    def entry(self, position, line):
+        key = (position, line)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+        self.recomputed += 1
+        weights = self.weights
+        exponents = [(line >> 4 * k) & 0xF for k in range(4)]
+        cells = [1 << e if e else 0 for e in exponents]
+        additive = 0
+        if position < 4 and weights["snake"]:
+            additive += weights["snake"] * sum(cell * weight for cell, weight in zip(cells, SNAKE_WEIGHTS[position]))
+        if weights["smoothness"]:
+            additive -= weights["smoothness"] * sum(c * abs(cells[p] - cells[q]) for p, q, c in LINE_SMOOTHNESS[position])
+        if position < 4 and weights["empty_tiles"]:
+            additive += weights["empty_tiles"] * cells.count(0)
+        if weights["merge_potential"]:
+            additive += weights["merge_potential"] * sum(cells[k] for k in range(3) if cells[k] == cells[k + 1])
+        up = sum(cells[k] <= cells[k + 1] for k in range(3))
+        down = sum(cells[k] >= cells[k + 1] for k in range(3))
+        entry = self.cache[key] = (line, additive, up, down)
+        return entry
+
+    def full(self, board):
+        return tuple(self.entry(position, line) for position, line in enumerate(board_lines(board)))
+
+    def update(self, partials, board):
+        # Partials of board, a successor of the board partials describe.
+        entry = self.entry
+        return tuple(old if old[0] == line else entry(position, line)
+                     for position, (old, line) in enumerate(zip(partials, board_lines(board))))
+
+    def spawn(self, partials, board, shift):
+        # A spawn at bit offset shift only changes one row and one column.
+        row, col = shift // 16, (shift % 16) // 4
+        column = 0
+        for i in range(4):
+            column |= ((board >> (16 * i + 4 * col)) & 0xF) << (4 * i)
+        partials = list(partials)
+        partials[row] = self.entry(row, (board >> (16 * row)) & ROW_MASK)
+        partials[4 + col] = self.entry(4 + col, column)
+        return tuple(partials)
+
+    def value(self, partials, board=None):
+        value = sum(entry[1] for entry in partials)
+        monotonicity = self.weights["monotonicity"]
+        if monotonicity:
+            rows, cols = partials[:4], partials[4:]
+            value += monotonicity * (max(sum(e[2] for e in rows), sum(e[3] for e in rows)) +
+                                     max(sum(e[2] for e in cols), sum(e[3] for e in cols)))
+        if self.debug and board is not None:
+            expected = evaluate_board(unpack_board(board), self.weights)
+            if abs(value - expected) > 1e-6 * max(1.0, abs(expected)):
+                raise AssertionError(f"incremental value {value} != full evaluation {expected} for board {board:#018x}")
+            if partials != self.full(board):
+                raise AssertionError(f"stale partial sums for board {board:#018x}")
+        return value
@@ -0,0 +1,109 @@
+import csv
+import json
+import statistics
+import time
+
+# Per-move fields, in CSV column order. Agents fill in the counters they
+# track; timings of the wrapped hot functions are added by the recorder.
+FIELDS = ("game_id", "game", "move", "agent", "action", "depth", "nodes", "max_nodes", "chance_nodes", "leaf_evals",
+          "children", "branching_factor", "tt_hits", "tt_misses", "heuristic_s", "movegen_s", "total_s")
+
+
+class SearchRecorder:
+    # Collects one record per move from an agent that has been given this
+    # recorder through agent.instrument(recorder). Uninstrumented agents
+    # only pay for a few integer counters, never for timers. Every game
+    # gets its own game_id, since several agents in one run play the same
+    # seeds (game).
+    def __init__(self):
+        self.records = []
+        self.current = None
+        self.game_id = 0
+        self.game = 0
+        self.move = 0
+        self._start = 0.0
+
+    def new_game(self, game):
+        self.game_id += 1
+        self.game = game
+        self.move = 0
+
+    def timed(self, function, field):
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                if self.current is not None:
+                    self.current[field] += time.perf_counter() - start
+        return wrapper
+
+    def begin_move(self):
+        self.current = {"heuristic_s": 0.0, "movegen_s": 0.0}
+        self._start = time.perf_counter()
+
+    def end_move(self, **fields):
+        record = self.current
+        record.update(fields)
+        record["game_id"] = self.game_id
+        record["game"] = self.game
+        record["move"] = self.move
+        record["total_s"] = time.perf_counter() - self._start
+        internal = record.get("max_nodes", 0) + record.get("chance_nodes", 0)
+        record["branching_factor"] = record.get("children", 0) / internal if internal else 0.0
+        self.records.append(record)
+        self.current = None
+        self.move += 1
+        return record
+
+    def discard_move(self):
+        # Drops the last record, for a choice that turned out not to be a
+        # legal move.
+        self.records.pop()
+        self.move -= 1
+
+    def game_records(self, game_id=None):
+        game_id = self.game_id if game_id is None else game_id
+        return [record for record in self.records if record["game_id"] == game_id]
+
+    def report(self, records=None):
+        records = self.game_records() if records is None else records
+        if not records:
+            return {"moves": 0}
+        total_s = sum(record["total_s"] for record in records)
+        nodes = sum(record.get("nodes", 0) for record in records)
+        times = sorted(record["total_s"] for record in records)
+        lookups = sum(record.get("tt_hits", 0) + record.get("tt_misses", 0) for record in records)
+        return {
+            "moves": len(records),
+            "nodes": nodes,
+            "nodes_per_move": nodes / len(records),
+            "nodes_per_s": nodes / total_s if total_s else 0.0,
+            "leaf_evals": sum(record.get("leaf_evals", 0) for record in records),
+            "mean_branching_factor": statistics.mean(record["branching_factor"] for record in records),
+            "max_depth": max(record.get("depth", 0) for record in records),
+            "mean_depth": statistics.mean(record.get("depth", 0) for record in records),
+            "heuristic_share": sum(record["heuristic_s"] for record in records) / total_s if total_s else 0.0,
+            "movegen_share": sum(record["movegen_s"] for record in records) / total_s if total_s else 0.0,
+            "tt_hit_rate": sum(record.get("tt_hits", 0) for record in records) / lookups if lookups else 0.0,
+            "mean_move_ms": 1000 * total_s / len(records),
+            "p95_move_ms": 1000 * times[min(len(times) - 1, int(0.95 * len(times)))],
+            "max_move_ms": 1000 * times[-1],
+        }
+
+    def write_jsonl(self, path):
+        with open(path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    def write_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def write(self, path):
+        if path.endswith(".csv"):
+            self.write_csv(path)
+        else:
+            self.write_jsonl(path)
@@ -1,4 +1,6 @@
 import random
+from . import bitboard
+from .spawn import SPAWN_PROBABILITIES, draw_value
 
 def move(direction, board):
     if direction == "w":
@@ -10,6 +12,10 @@ def move(direction, board):
     if direction == "d":
         return move_right(board)
 
+def successors(board):
+    return [(action, bitboard.unpack_board(new_board), score)
+            for action, new_board, score in bitboard.successors(bitboard.pack_board(board))]
+
 def check_game_status(board, max_tile=2048):
     flat_board = [cell for row in board for cell in row]
     if max_tile in flat_board:
@@ -25,18 +31,13 @@ def check_game_status(board, max_tile=2048):
     else:
         return "PLAY"
 
-def fill_two_or_four(board, iter=1):
+def fill_two_or_four(board, iter=1, rng=random, probabilities=SPAWN_PROBABILITIES):
     for _ in range(iter):
-        a = random.randint(0, 3)
-        b = random.randint(0, 3)
-        while(board[a][b] != 0):
-            a = random.randint(0, 3)
-            b = random.randint(0, 3)
-
+        a, b = rng.choice([(i, j) for i in range(4) for j in range(4) if board[i][j] == 0])
         if sum([cell for row in board for cell in row]) in (0, 2):
             board[a][b] = 2
         else:
-            board[a][b] = random.choice((2, 4))
+            board[a][b] = draw_value(rng, probabilities)
     return board
 
 def move_left(board):
@@ -69,8 +70,7 @@ def move_right(board):
 
 def move_down(board):
     board = rotate_left(board)
-    board = move_left(board)
-    shift_right(board)
+    board = move_right(board)
     board = rotate_right(board)
     return board
 
@@ -0,0 +1,164 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from .bitboard import empty_cells, max_exponent
+from .expectimax_agent import ExpectimaxAgent, SearchTimeout, WIN_EXPONENT
+from .transposition import SharedTranspositionTable
+
+COUNTERS = ("nodes", "max_nodes", "chance_nodes", "leaf_evals", "children")
+
+_worker = None
+_worker_move = None
+
+
+def _start_worker(params, tt_name, tt_entries):
+    global _worker
+    _worker = ExpectimaxAgent(**params)
+    _worker.shared_tt = tt_name is not None
+    if tt_name is not None:
+        _worker.tt = SharedTranspositionTable(tt_entries, tt_name)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _search(board, depth, is_maximizing, prob, deadline, move):
+    # Searches one subtree in a worker. deadline is wall-clock time; the
+    # result is None when the subtree did not finish before it. A private
+    # transposition table is cleared when a new move starts, as in the
+    # serial agent.
+    global _worker_move
+    agent = _worker
+    if move != _worker_move:
+        _worker_move = move
+        if agent.tt is not None and not agent.shared_tt and not agent.persist_tt:
+            agent.tt.clear()
+    agent.reset_counters()
+    tt_hits, tt_misses = (agent.tt.hits, agent.tt.misses) if agent.tt is not None else (0, 0)
+    agent.deadline = None if deadline is None else time.perf_counter() + (deadline - time.time())
+    try:
+        value = agent.expectimax(board, depth, is_maximizing, prob)
+    except SearchTimeout:
+        value = None
+    finally:
+        agent.deadline = None
+    counters = {name: getattr(agent, name) for name in COUNTERS}
+    if agent.tt is not None:
+        counters["tt_hits"] = agent.tt.hits - tt_hits
+        counters["tt_misses"] = agent.tt.misses - tt_misses
+    return value, counters
+
+
+class ParallelExpectimaxAgent(ExpectimaxAgent):
+    # Expectimax whose root moves are searched in a pool of worker processes.
+    # With split_chance the chance node below each root move is expanded
+    # here and every spawn subtree becomes a task of its own, which keeps
+    # more workers busy when there are few legal moves.
+    #
+    # The pool (and the agents inside it) is started on the first move and
+    # kept until close(); play_headless closes it when a game ends, and the
+    # next move starts them again. With shared_tt (a number of entries) all
+    # processes share one lockless transposition table. A time_budget is enforced in the workers and
+    # while waiting for them.
+    #
+    # Scores are combined in the same order as the serial search, so at the
+    # same depth the moves and scores match ExpectimaxAgent, except where
+    # sample_cells (split_chance is then disabled) or a transposition table
+    # with prob_cutoff make the serial search order-dependent.
+    def __init__(self, workers=None, split_chance=False, shared_tt=0, **params):
+        # Workers build their agents from params, so an evaluator has to be
+        # the path of saved weights that each of them loads.
+        evaluator = params.get("evaluator")
+        if evaluator is not None and not isinstance(evaluator, str):
+            raise ValueError("ParallelExpectimaxAgent takes the evaluator as the path of its saved weights")
+        super().__init__(**params)
+        self.params = params
+        self.workers = workers or os.cpu_count()
+        self.split_chance = split_chance and not self.sample_cells
+        self.shared_tt = shared_tt
+        self.executor = None
+        self.move = 0
+        if shared_tt:
+            self.tt = SharedTranspositionTable(shared_tt)
+
+    def warm_up(self):
+        if self.executor is not None:
+            return
+        # close() releases the shared table; a reused agent gets a new one.
+        if self.shared_tt and self.tt is None:
+            self.tt = SharedTranspositionTable(self.shared_tt)
+        tt_name = self.tt.name if self.shared_tt else None
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_start_worker,
+                                            initargs=(self.params, tt_name, self.shared_tt))
+        # Starts every worker (and builds its agent) before the first move.
+        for future in [self.executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        if self.shared_tt and self.tt is not None:
+            self.tt.close()
+            self.tt = None
+
+    def choose_move(self, board):
+        self.move += 1
+        return super().choose_move(board)
+
+    def splittable(self, board, depth):
+        # Whether search() would expand board as a full chance node. Root
+        # children are reached with probability 1.0, and search() scores a
+        # node reached with a probability below prob_cutoff as a leaf.
+        return (depth >= 2 and max_exponent(board) < WIN_EXPONENT and self.prob_cutoff <= 1.0
+                and empty_cells(board))
+
+    def search_root(self, board, depth, order=None, scores=None):
+        self.warm_up()
+        deadline = None if self.deadline is None else time.time() + (self.deadline - time.perf_counter())
+        submit = self.executor.submit
+        children = {action: new_board for action, new_board, _ in self.successors(board)}
+        jobs = {}
+        for action in order or self.actions:
+            if action not in children:
+                continue
+            child = children[action]
+            if not (self.split_chance and self.splittable(child, depth)):
+                jobs[action] = (None, [(1.0, submit(_search, child, depth, False, 1.0, deadline, self.move))])
+                continue
+            empty = empty_cells(child)
+            spawns = self.spawn_exponents
+            self.nodes += 1
+            self.chance_nodes += 1
+            self.children += len(empty) * len(spawns)
+            cell_prob = 1.0 / len(empty)
+            jobs[action] = (len(empty), [(spawn_prob, submit(_search, child | (exponent << shift), depth - 1, True,
+                                                             cell_prob * spawn_prob, deadline, self.move))
+                                         for shift in empty for exponent, spawn_prob in spawns])
+
+        scores = {} if scores is None else scores
+        try:
+            for action, (cells, tasks) in jobs.items():
+                value = 0
+                for spawn_prob, future in tasks:
+                    timeout = None if deadline is None else max(0.0, deadline - time.time())
+                    child_value, counters = future.result(timeout=timeout)
+                    if child_value is None:
+                        raise SearchTimeout()
+                    self.add_counters(counters)
+                    value = child_value if cells is None else value + spawn_prob * child_value
+                scores[action] = value if cells is None else value / cells
+        except (SearchTimeout, TimeoutError):
+            for _, tasks in jobs.values():
+                for _, future in tasks:
+                    future.cancel()
+            raise SearchTimeout()
+        return self.best_action(scores), scores
+
+    def add_counters(self, counters):
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + counters[name])
+        if self.tt is not None and "tt_hits" in counters:
+            self.tt.hits += counters["tt_hits"]
+            self.tt.misses += counters["tt_misses"]
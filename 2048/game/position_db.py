@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import bitboard
+from .engine import play_headless
+
+# File layout: 8-byte magic, uint64 entry count n, then n sorted uint64
+# canonical boards followed by n ENTRY records. The heuristics are not
+# symmetric, so each entry keeps the best move of all 8 orientations: bits
+# 2k..2k+1 of moves hold the action index for the board whose canonical
+# symmetry index is k. value is the canonical board's search value.
+MAGIC = b"P2048v1\0"
+HEADER_BYTES = 16
+ENTRY = np.dtype([("moves", "<u2"), ("depth", "u1"), ("value", "<f4"), ("count", "<u4")])
+ENTRY_BYTES = 8 + ENTRY.itemsize
+
+
+class PositionDB:
+    # Best moves of frequently seen positions, keyed by the symmetry-canonical
+    # packed board. A loaded database stays memory-mapped and is searched by
+    # binary search.
+    def __init__(self, keys=None, entries=None, path=None):
+        self.keys = np.zeros(0, dtype=np.uint64) if keys is None else keys
+        self.entries = np.zeros(0, dtype=ENTRY) if entries is None else entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER_BYTES)
+        if header[:8] != MAGIC:
+            raise ValueError(f"{path} is not a position database")
+        count = int(np.frombuffer(header[8:], dtype=np.uint64)[0])
+        if not count:
+            return cls(path=path)
+        keys = np.memmap(path, dtype=np.uint64, mode="r", offset=HEADER_BYTES, shape=(count,))
+        entries = np.memmap(path, dtype=ENTRY, mode="r", offset=HEADER_BYTES + 8 * count, shape=(count,))
+        return cls(keys, entries, path)
+
+    def lookup(self, board, min_depth=0):
+        # (action, depth, value) for a packed board, or None when the board
+        # is not stored or was searched shallower than min_depth.
+        key, index = bitboard.canonical(board)
+        position = int(np.searchsorted(self.keys, np.uint64(key)))
+        if position < len(self.keys) and int(self.keys[position]) == key:
+            entry = self.entries[position]
+            if entry["depth"] >= min_depth:
+                self.hits += 1
+                action = bitboard.ACTIONS[(int(entry["moves"]) >> (2 * index)) & 3]
+                return action, int(entry["depth"]), float(entry["value"])
+        self.misses += 1
+        return None
+
+    def save(self, path=None):
+        path = path or self.path
+        order = np.argsort(self.keys)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.uint64(len(self.keys)).tobytes())
+            f.write(np.asarray(self.keys)[order].tobytes())
+            f.write(np.asarray(self.entries)[order].tobytes())
+        os.replace(tmp_path, path)
+        return path
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class _PositionCounter:
+    # Observer counting the canonical boards an agent is asked to move from.
+    def __init__(self, counts, max_moves):
+        self.counts = counts
+        self.max_moves = max_moves
+        self.moves = 0
+
+    def on_start(self, board):
+        self.moves = 0
+        self.counts[bitboard.canonical(bitboard.pack_board(board))[0]] += 1
+
+    def on_move(self, board, action):
+        self.moves += 1
+        if self.max_moves is None or self.moves < self.max_moves:
+            self.counts[bitboard.canonical(bitboard.pack_board(board))[0]] += 1
+
+    def on_end(self, board, status):
+        pass
+
+
+def count_positions(num_games, ai_mode="random", seed=0, max_moves=None, agent_params=None, records=None):
+    # How often every canonical position occurs in seeded headless games, or
+    # in the games of a record file (game.records), counting at most the
+    # first max_moves positions of each game.
+    counts = Counter()
+    if records is not None:
+        from .records import iter_games
+        for game in iter_games(records):
+            counts[bitboard.canonical(game.initial)[0]] += 1
+            for move, (_, _, _, _, board) in enumerate(game.replay(), 1):
+                if max_moves is not None and move >= max_moves:
+                    break
+                counts[bitboard.canonical(board)[0]] += 1
+        return counts
+    counter = _PositionCounter(counts, max_moves)
+    for k in range(num_games):
+        play_headless(ai_mode, seed + k, agent_params=agent_params, observer=counter)
+    return counts
+
+
+def select_positions(counts, max_positions=None, min_count=2, max_bytes=None):
+    # The most frequent positions seen at least min_count times, within
+    # max_positions entries and max_bytes on disk.
+    limit = max_positions
+    if max_bytes is not None:
+        by_size = max(0, (max_bytes - HEADER_BYTES) // ENTRY_BYTES)
+        limit = by_size if limit is None else min(limit, by_size)
+    ranked = [(board, count) for board, count in counts.most_common() if count >= min_count]
+    return ranked[:limit]
+
+
+def _solve(boards, depth, agent_params):
+    # (canonical board, packed moves, value) for every canonical board.
+    from .expectimax_agent import ExpectimaxAgent
+    agent = ExpectimaxAgent(depth=depth, **(agent_params or {}))
+    solved = []
+    for key in boards:
+        moves, value = 0, None
+        for board in {bitboard.symmetry(key, index) for index in range(8)}:
+            action, scores = agent.search_root(board, depth)
+            if action is None:
+                break
+            moves |= bitboard.ACTIONS.index(action) << (2 * bitboard.canonical(board)[1])
+            if board == key:
+                value = float(scores[action])
+        if value is not None:
+            solved.append((key, moves, value))
+    return solved
+
+
+def build(positions, depth=4, agent_params=None, workers=None, chunk=64):
+    # Searches every (board, count) position with ExpectimaxAgent at depth.
+    boards = [board for board, _ in positions]
+    counts = dict(positions)
+    chunks = [boards[start:start + chunk] for start in range(0, len(boards), chunk)]
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_solve, chunks, [depth] * len(chunks), [agent_params] * len(chunks))
+            solved = [row for rows in results for row in rows]
+    else:
+        solved = [row for rows in chunks for row in _solve(rows, depth, agent_params)]
+    keys = np.array([board for board, _, _ in solved], dtype=np.uint64)
+    entries = np.zeros(len(solved), dtype=ENTRY)
+    entries["moves"] = [moves for _, moves, _ in solved]
+    entries["depth"] = depth
+    entries["value"] = [value for _, _, value in solved]
+    entries["count"] = [min(counts[board], 2**32 - 1) for board, _, _ in solved]
+    order = np.argsort(keys)
+    return PositionDB(keys[order], entries[order])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a position database from headless games.")
+    parser.add_argument("--out", default="positions.db")
+    parser.add_argument("--games", type=int, default=1000, help="headless games to collect positions from")
+    parser.add_argument("--agent", default="random", help="agent playing the collection games")
+    parser.add_argument("--records", help="collect positions from this game record file instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-moves", type=int, help="only count the first positions of every game")
+    parser.add_argument("--max-positions", type=int, default=100000)
+    parser.add_argument("--max-mb", type=float, help="size limit of the database file")
+    parser.add_argument("--min-count", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+
+    counts = count_positions(args.games, args.agent, args.seed, args.max_moves, records=args.records)
+    positions = select_positions(counts, args.max_positions, args.min_count,
+                                 int(args.max_mb * 2**20) if args.max_mb else None)
+    db = build(positions, args.depth, workers=args.workers)
+    db.save(args.out)
+    print(json.dumps({"seen": len(counts), "stored": len(db), "depth": args.depth, "path": args.out,
+                      "bytes": os.path.getsize(args.out)}))
+
+
+if __name__ == "__main__":
+    main()
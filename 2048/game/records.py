@@ -0,0 +1,196 @@
+import struct
+import numpy as np
+from . import bitboard
+
+# A record file is MAGIC followed by one frame per game:
+#
+#   GAME header: seed (uint64), initial packed board (uint64), number of
+#                moves n (uint32), final status (uint8), flags (uint8)
+#   n move bytes: action index in bits 0-1, spawned cell (0-15) in bits
+#                2-5, set bit 6 when the spawn was a 4
+#   with HAS_STATS, n STATS entries: nodes searched (uint32), move time in
+#                seconds (float32), search depth (uint8)
+#
+# All fields are little-endian. Frames are self-delimiting, so a file of
+# any size can be scanned or indexed without reading the move data.
+MAGIC = b"R2048v1\0"
+GAME = struct.Struct("<QQIBB")
+STATS = np.dtype([("nodes", "<u4"), ("time_s", "<f4"), ("depth", "u1")])
+HAS_STATS = 1
+STATUSES = ("PLAY", "WIN", "LOSE", "TIMEOUT", "CANCELLED")
+FOUR_BIT = 0x40
+
+
+class GameRecord:
+    def __init__(self, seed, initial, status, moves, stats=None, offset=None):
+        self.seed = seed
+        self.initial = initial
+        self.status = status
+        self.moves = moves
+        self.stats = stats
+        self.offset = offset
+
+    def __len__(self):
+        return len(self.moves)
+
+    def actions(self):
+        return [bitboard.ACTIONS[byte & 3] for byte in self.moves]
+
+    def replay(self):
+        # Yields (board, action, afterstate, merge_score, next_board) for
+        # every move, all boards packed.
+        board = self.initial
+        for byte in self.moves:
+            action = bitboard.ACTIONS[byte & 3]
+            for legal, afterstate, score in bitboard.successors(board):
+                if legal == action:
+                    break
+            else:
+                raise ValueError(f"illegal move {action!r} in game with seed {self.seed}")
+            exponent = 2 if byte & FOUR_BIT else 1
+            next_board = afterstate | (exponent << (4 * ((byte >> 2) & 0xF)))
+            yield board, action, afterstate, score, next_board
+            board = next_board
+
+    def final_board(self):
+        board = self.initial
+        for _, _, _, _, next_board in self.replay():
+            board = next_board
+        return board
+
+
+class RecordWriter:
+    # Streams games to a record file. The moves of the game in progress are
+    # kept in memory and each game is written (and flushed) as one frame
+    # when it ends, so an interrupted run leaves only whole games behind.
+    def __init__(self, path, stats=True, append=False):
+        self.stats = stats
+        self.file = open(path, "ab" if append else "wb")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.games = 0
+        self._moves = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def begin_game(self, seed, board):
+        self._seed, self._initial = seed, board
+        self._moves = bytearray()
+        self._stats = []
+
+    def add_move(self, action, afterstate, next_board, nodes=0, time_s=0.0, depth=0):
+        # The spawn is whatever next_board has that the afterstate has not.
+        # Only 2s and 4s can be encoded.
+        spawned = next_board ^ afterstate
+        shift = (spawned.bit_length() - 1) // 4 * 4
+        if spawned >> shift not in (1, 2):
+            raise ValueError(f"cannot record a spawned {1 << (spawned >> shift)}: only 2 and 4 spawns are encoded")
+        byte = bitboard.ACTIONS.index(action) | (shift // 4) << 2
+        if spawned >> shift == 2:
+            byte |= FOUR_BIT
+        self._moves.append(byte)
+        if self.stats:
+            self._stats.append((nodes, time_s, depth))
+
+    def end_game(self, status):
+        flags = HAS_STATS if self.stats else 0
+        self.file.write(GAME.pack(self._seed, self._initial, len(self._moves), STATUSES.index(status), flags))
+        self.file.write(self._moves)
+        if self.stats:
+            self.file.write(np.array(self._stats, dtype=STATS).tobytes())
+        self.file.flush()
+        self.games += 1
+        self._moves = None
+
+
+def _open(path):
+    f = open(path, "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path} is not a game record file")
+    return f
+
+
+def _read_frame(f, with_moves=True):
+    offset = f.tell()
+    header = f.read(GAME.size)
+    if not header:
+        return None
+    if len(header) < GAME.size:
+        raise ValueError(f"truncated game header at offset {offset}")
+    seed, initial, count, status, flags = GAME.unpack(header)
+    stats_size = count * STATS.itemsize if flags & HAS_STATS else 0
+    if not with_moves:
+        f.seek(count + stats_size, 1)
+        return GameRecord(seed, initial, STATUSES[status], None, offset=offset), count
+    moves = f.read(count)
+    stats = np.frombuffer(f.read(stats_size), dtype=STATS) if stats_size else None
+    return GameRecord(seed, initial, STATUSES[status], moves, stats, offset), count
+
+
+def iter_games(path):
+    # Yields the games of a record file one at a time.
+    with _open(path) as f:
+        while True:
+            frame = _read_frame(f)
+            if frame is None:
+                return
+            yield frame[0]
+
+
+def index_games(path):
+    # (offset, seed, moves, status) of every game, reading only the headers.
+    index = []
+    with _open(path) as f:
+        while True:
+            frame = _read_frame(f, with_moves=False)
+            if frame is None:
+                return index
+            record, count = frame
+            index.append((record.offset, record.seed, count, record.status))
+
+
+def read_game(path, offset):
+    with _open(path) as f:
+        f.seek(offset)
+        return _read_frame(f)[0]
+
+
+def iter_batches(games, batch_size=4096):
+    # Flattens the moves of the given games (e.g. iter_games(path)) into
+    # dicts of numpy arrays with up to batch_size moves each: boards,
+    # actions (indices into ACTIONS), afterstates, merge_scores, rewards
+    # (the qlearning reward: the merge score, as a move never changes the
+    # tile sum), next_boards and dones (the game's last move).
+    columns = {name: [] for name in ("boards", "actions", "afterstates", "merge_scores", "rewards", "next_boards",
+                                     "dones")}
+    dtypes = {"boards": np.uint64, "actions": np.uint8, "afterstates": np.uint64, "merge_scores": np.int32,
+              "rewards": np.int32, "next_boards": np.uint64, "dones": bool}
+
+    def flush():
+        batch = {name: np.array(values, dtype=dtypes[name]) for name, values in columns.items()}
+        for values in columns.values():
+            values.clear()
+        return batch
+
+    for game in games:
+        last = len(game) - 1
+        for move, (board, action, afterstate, score, next_board) in enumerate(game.replay()):
+            columns["boards"].append(board)
+            columns["actions"].append(bitboard.ACTIONS.index(action))
+            columns["afterstates"].append(afterstate)
+            columns["merge_scores"].append(score)
+            columns["rewards"].append(score)
+            columns["next_boards"].append(next_board)
+            columns["dones"].append(move == last)
+            if len(columns["boards"]) == batch_size:
+                yield flush()
+    if columns["boards"]:
+        yield flush()
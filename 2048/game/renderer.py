@@ -0,0 +1,101 @@
+import time
+import pygame
+
+
+class BoardRenderer:
+    # Draws 4x4 boards (lists of tile values) onto screen. Every tile is
+    # rendered once per (theme, value) and then only blitted; a frame redraws
+    # just the cells whose value changed since the last one and hands their
+    # rects to pygame.display.update.
+    #
+    # Frames are limited to fps: a board drawn sooner than 1 / fps after the
+    # previous frame is kept as pending and replaced by the next one, so a
+    # fast agent is never held up by the screen. flush() shows the pending
+    # board. begin_wait() and end_wait() bracket the time the caller spends
+    # away from the renderer (an agent thinking): when the last wait was
+    # longer than the time until the next frame is due, begin_wait() shows
+    # the pending board at once, so a slow move never leaves an old position
+    # on screen. Anything else drawn over the board must be followed by
+    # invalidate(), which makes the next frame a full redraw.
+    def __init__(self, screen, constants, font, fps=60):
+        self.screen = screen
+        self.constants = constants
+        self.font = font
+        self.interval = 1.0 / fps if fps else 0.0
+        self.box = constants["size"] // 4
+        self.padding = constants["padding"]
+        self.tiles = {}
+        self.shown = None
+        self.shown_theme = None
+        self.pending = None
+        self.last_frame = 0.0
+        self.wait_start = None
+        self.last_wait = float("inf")
+        self.frames = 0
+        self.skipped = 0
+
+    def colour(self, theme, key):
+        colours = self.constants["colour"][theme]
+        return tuple(colours.get(str(key), colours["2048"]))
+
+    def tile(self, theme, value):
+        surface = self.tiles.get((theme, value))
+        if surface is None:
+            size = self.box - 2 * self.padding
+            surface = pygame.Surface((size, size)).convert(self.screen)
+            surface.fill(self.colour(theme, value))
+            if value != 0:
+                text_colour = self.colour(theme, "dark" if value in (2, 4) else "light")
+                text = self.font.render("{:>4}".format(value), 1, text_colour)
+                surface.blit(text, (1.5 * self.padding, 6 * self.padding))
+            self.tiles[(theme, value)] = surface
+        return surface
+
+    def cell_rect(self, i, j):
+        size = self.box - 2 * self.padding
+        return pygame.Rect(j * self.box + self.padding, i * self.box + self.padding, size, size)
+
+    def invalidate(self):
+        self.shown = None
+
+    def draw(self, board, theme, force=False):
+        # Shows board now, or keeps it pending when the last frame was less
+        # than 1 / fps ago (unless force).
+        now = time.perf_counter()
+        if not force and now - self.last_frame < self.interval:
+            self.pending = (board, theme)
+            self.skipped += 1
+            return False
+        self.pending = None
+        self.last_frame = now
+        self.frames += 1
+        cells = [row[:] for row in board]
+        if self.shown is None or theme != self.shown_theme:
+            size = self.constants["size"]
+            self.screen.fill(self.colour(theme, "background"), (0, 0, size, size))
+            dirty = [pygame.Rect(0, 0, size, size)]
+            changed = [(i, j) for i in range(4) for j in range(4)]
+        else:
+            changed = [(i, j) for i in range(4) for j in range(4) if cells[i][j] != self.shown[i][j]]
+            dirty = [self.cell_rect(i, j) for i, j in changed]
+        for i, j in changed:
+            self.screen.blit(self.tile(theme, cells[i][j]), self.cell_rect(i, j))
+        self.shown, self.shown_theme = cells, theme
+        if dirty:
+            pygame.display.update(dirty)
+        return True
+
+    def begin_wait(self):
+        now = time.perf_counter()
+        self.wait_start = now
+        if self.pending is not None and self.last_wait >= self.interval - (now - self.last_frame):
+            self.flush()
+
+    def end_wait(self):
+        if self.wait_start is not None:
+            self.last_wait = time.perf_counter() - self.wait_start
+            self.wait_start = None
+
+    def flush(self):
+        if self.pending is not None:
+            self.draw(*self.pending, force=True)
@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from . import bitboard
+from .engine import AI_MODES, latency_summary, make_agent
+from .expectimax_agent import ExpectimaxAgent
+
+# Protocol: newline-delimited JSON over a stream socket. A request is
+#
+#   {"id": any, "boards": [board, ...], "agent": "expectimax",
+#    "params": {...}, "deadline_ms": 100}
+#
+# where a board is a packed int (see game.bitboard) or a 4x4 list of tile
+# values, params are agent constructor arguments as for simulate.py --param,
+# and deadline_ms (optional) is measured from when the request is read. The
+# reply is {"id", "moves": [...], "results": [...], "latency_ms"}, with one
+# result per board: move (None when no move is legal), depth searched and
+# source ("search", or "fallback" when the board's search missed the
+# deadline). {"id", "op": "metrics"} is answered with the service metrics.
+# Requests on one connection are served concurrently, so replies can arrive
+# out of order; match them by id.
+MAX_BATCH = 1024
+# Headroom left to a worker for sending its answer back before the deadline.
+RESULT_MARGIN = 0.005
+LATENCY_WINDOW = 1000
+# Agents a worker keeps, the least recently used (agent, params) going first.
+MAX_AGENTS = 8
+
+_agents = OrderedDict()
+
+
+def _agent(ai_mode, params_key):
+    key = (ai_mode, params_key)
+    if key in _agents:
+        _agents.move_to_end(key)
+        return _agents[key]
+    agent = _agents[key] = make_agent(ai_mode, **json.loads(params_key))
+    while len(_agents) > MAX_AGENTS:
+        _, evicted = _agents.popitem(last=False)
+        if hasattr(evicted, "close"):
+            evicted.close()
+    return agent
+
+
+def _move(ai_mode, params_key, packed, deadline):
+    # Chooses a move in a worker. deadline is wall-clock time (or None). An
+    # expectimax agent without a time_budget of its own deepens iteratively
+    # up to its depth until the deadline, and one with a time_budget gets
+    # the smaller of the two, so a late answer is the best move of the
+    # deepest iteration that finished.
+    agent = _agent(ai_mode, params_key)
+    board = bitboard.unpack_board(packed)
+    start = time.perf_counter()
+    result = {"depth": 0, "nodes": 0}
+    if ai_mode == "expectimax":
+        time_budget, max_depth = agent.time_budget, agent.max_depth
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.time() - RESULT_MARGIN)
+            if agent.time_budget is None:
+                agent.max_depth = agent.depth
+            agent.time_budget = remaining if time_budget is None else min(time_budget, remaining)
+        try:
+            move = agent.getNextBestMoveExpectiminimax(board)
+        finally:
+            agent.time_budget, agent.max_depth = time_budget, max_depth
+        result["depth"] = agent.completed_depth
+        result["nodes"] = agent.nodes
+    elif ai_mode == "qlearning":
+        move = agent.get_best_action(agent.get_state(board))
+    else:
+        move = agent.get_move(board)
+    result["move"] = move
+    result["search_ms"] = 1000 * (time.perf_counter() - start)
+    return result
+
+
+def parse_board(board):
+    if isinstance(board, int):
+        return board
+    if len(board) != 4 or any(len(row) != 4 for row in board):
+        raise ValueError("a board is a packed int or a 4x4 list of tile values")
+    return bitboard.pack_board(board)
+
+
+class MoveService:
+    # Serves move requests from a pool of worker processes, each keeping one
+    # agent per (agent, params). Boards already being searched with the same
+    # agent and params are not searched again: later requests wait for the
+    # search in flight, which runs against the deadline of the request that
+    # started it. A request whose deadline passes before its search returns
+    # (or whose search had no time to complete depth 1) gets the move of a
+    # depth-1 expectimax search made in a thread of this process instead, so
+    # the event loop keeps serving other connections meanwhile.
+    def __init__(self, workers=None, default_deadline_ms=None, max_batch=MAX_BATCH):
+        self.workers = workers or os.cpu_count()
+        self.default_deadline_ms = default_deadline_ms
+        self.max_batch = max_batch
+        self.executor = None
+        self.fallback_executor = None
+        self.fallback_agent = ExpectimaxAgent(depth=1, incremental=True)
+        self.inflight = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.counters = Counter()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.search_times = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            # One thread, as the fallback agent is not shared between threads.
+            self.fallback_executor = ThreadPoolExecutor(max_workers=1)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.fallback_executor.shutdown(cancel_futures=True)
+            self.executor = None
+            self.fallback_executor = None
+
+    def _fallback_search(self, packed):
+        self.fallback_agent.reset_counters()
+        move, _ = self.fallback_agent.search_root(packed, 1)
+        return {"move": move, "depth": 1, "nodes": self.fallback_agent.nodes, "source": "fallback"}
+
+    async def fallback(self, packed):
+        self.counters["fallbacks"] += 1
+        return await asyncio.get_running_loop().run_in_executor(self.fallback_executor, self._fallback_search, packed)
+
+    def submit(self, ai_mode, params_key, packed, deadline):
+        # [pool future, asyncio future, number of waiting requests]
+        key = (ai_mode, params_key, packed)
+        entry = self.inflight.get(key)
+        if entry is not None:
+            self.counters["merged"] += 1
+            entry[2] += 1
+            return entry
+        pool_future = self.executor.submit(_move, ai_mode, params_key, packed, deadline)
+        future = asyncio.wrap_future(pool_future)
+        entry = self.inflight[key] = [pool_future, future, 1]
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        def done(future):
+            self.queue_depth -= 1
+            if self.inflight.get(key) is entry:
+                del self.inflight[key]
+            if not future.cancelled() and future.exception() is None:
+                self.search_times.append(future.result()["search_ms"] / 1000)
+
+        future.add_done_callback(done)
+        return entry
+
+    async def move(self, ai_mode, params_key, packed, deadline):
+        if not any(True for _ in bitboard.successors(packed)):
+            return {"move": None, "depth": 0, "nodes": 0, "source": "search"}
+        key = (ai_mode, params_key, packed)
+        entry = self.submit(ai_mode, params_key, packed, deadline)
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            result = await asyncio.wait_for(asyncio.shield(entry[1]), timeout)
+        except asyncio.TimeoutError:
+            result = None
+        except asyncio.CancelledError:
+            # The search was cancelled under this request, not the request.
+            if not entry[1].cancelled():
+                raise
+            result = None
+        finally:
+            # The last request to give up on a search that has not started
+            # yet takes it off the pool's queue. It leaves the in-flight map
+            # first, so no later request can merge into a cancelled search.
+            entry[2] -= 1
+            if entry[2] == 0 and not entry[1].done():
+                if self.inflight.get(key) is entry:
+                    del self.inflight[key]
+                entry[0].cancel()
+        if result is None or (ai_mode == "expectimax" and result["depth"] == 0):
+            # Past the deadline, or the search started too late to finish
+            # even its first iteration.
+            return await self.fallback(packed)
+        return dict(result, source="search")
+
+    async def handle(self, request):
+        start = time.perf_counter()
+        if request.get("op") == "metrics":
+            return {"id": request.get("id"), "metrics": self.metrics()}
+        ai_mode = request.get("agent", "expectimax")
+        if ai_mode not in AI_MODES:
+            raise ValueError(f"unknown agent {ai_mode!r}, expected one of {AI_MODES}")
+        params = request.get("params") or {}
+        if "workers" in params:
+            raise ValueError("agents with worker pools of their own cannot be served")
+        boards = [parse_board(board) for board in request.get("boards", [])]
+        if len(boards) > self.max_batch:
+            raise ValueError(f"at most {self.max_batch} boards per request")
+        deadline_ms = request.get("deadline_ms", self.default_deadline_ms)
+        deadline = None if deadline_ms is None else time.time() + deadline_ms / 1000
+        params_key = json.dumps(params, sort_keys=True)
+        self.counters["requests"] += 1
+        self.counters["boards"] += len(boards)
+        results = await asyncio.gather(*(self.move(ai_mode, params_key, board, deadline) for board in boards))
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        return {"id": request.get("id"), "moves": [result["move"] for result in results], "results": results,
+                "latency_ms": 1000 * elapsed}
+
+    async def reply(self, line, writer):
+        request = None
+        try:
+            request = json.loads(line)
+            response = await self.handle(request)
+        except (ValueError, TypeError, KeyError, AttributeError) as error:
+            self.counters["errors"] += 1
+            response = {"id": request.get("id") if isinstance(request, dict) else None, "error": str(error)}
+        except asyncio.CancelledError:
+            # Still answer the client before the task ends.
+            self.counters["errors"] += 1
+            response = {"id": request.get("id") if isinstance(request, dict) else None, "error": "request cancelled"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            raise
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+
+    async def serve_client(self, reader, writer):
+        self.counters["connections"] += 1
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(self.reply(line, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    def metrics(self):
+        return {
+            "uptime_s": time.time() - self.started,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "inflight_boards": len(self.inflight),
+            "requests": self.counters["requests"],
+            "boards": self.counters["boards"],
+            "merged": self.counters["merged"],
+            "fallbacks": self.counters["fallbacks"],
+            "errors": self.counters["errors"],
+            "connections": self.counters["connections"],
+            "latency": latency_summary(list(self.latencies)),
+            "search": latency_summary(list(self.search_times)),
+        }
+
+    async def serve(self, path=None, host="127.0.0.1", port=2048, ready=None):
+        # Serves on the Unix socket at path, or on TCP host:port, until
+        # cancelled. ready, if given, is called with the server once it
+        # listens.
+        self.start()
+        if path is not None:
+            server = await asyncio.start_unix_server(self.serve_client, path)
+        else:
+            server = await asyncio.start_server(self.serve_client, host, port)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+            if path is not None and os.path.exists(path):
+                os.unlink(path)
+
+
+class MoveClient:
+    # Blocking client for a MoveService, one request at a time.
+    def __init__(self, path=None, host="127.0.0.1", port=2048, timeout=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.socket.settimeout(timeout)
+        self.file = self.socket.makefile("rb")
+        self.next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def request(self, **request):
+        self.next_id += 1
+        request["id"] = self.next_id
+        self.socket.sendall(json.dumps(request).encode() + b"\n")
+        response = json.loads(self.file.readline())
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response
+
+    def moves(self, boards, agent="expectimax", params=None, deadline_ms=None):
+        request = {"boards": boards, "agent": agent, "params": params or {}}
+        if deadline_ms is not None:
+            request["deadline_ms"] = deadline_ms
+        return self.request(**request)
+
+    def metrics(self):
+        return self.request(op="metrics")["metrics"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve agent moves over a Unix or TCP socket.")
+    parser.add_argument("--unix", metavar="PATH", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2048)
+    parser.add_argument("--workers", type=int, help="search processes (default: all cores)")
+    parser.add_argument("--deadline-ms", type=float, help="deadline of requests that do not set one")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args(argv)
+
+    service = MoveService(args.workers, args.deadline_ms, args.max_batch)
+    where = args.unix or f"{args.host}:{args.port}"
+    try:
+        asyncio.run(service.serve(args.unix, args.host, args.port,
+                                  ready=lambda server: print(f"serving moves on {where}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import random
+from .bitboard import empty_cells
+
+# Tile values spawned after every move and their probabilities. The game
+# loop draws from these and ExpectimaxAgent's chance nodes are weighted by
+# them, so changing them here changes both.
+SPAWN_PROBABILITIES = ((2, 0.9), (4, 0.1))
+
+# Boards whose tiles sum to 0 or 2: the opening spawns are always 2s.
+_OPENING_BOARDS = frozenset([0] + [1 << shift for shift in range(0, 64, 4)])
+
+
+def spawn_exponents(probabilities=SPAWN_PROBABILITIES):
+    return tuple((value.bit_length() - 1, prob) for value, prob in probabilities)
+
+
+def draw_value(rng, probabilities=SPAWN_PROBABILITIES):
+    r = rng.random()
+    for value, prob in probabilities:
+        r -= prob
+        if r < 0:
+            return value
+    return probabilities[-1][0]
+
+
+def fill_two_or_four(board, iter=1, rng=random, probabilities=SPAWN_PROBABILITIES):
+    # Spawns iter tiles on a packed board, each on a cell drawn directly
+    # from the empty ones.
+    for _ in range(iter):
+        shift = rng.choice(empty_cells(board))
+        value = 2 if board in _OPENING_BOARDS else draw_value(rng, probabilities)
+        board |= (value.bit_length() - 1) << shift
+    return board
+
+
+def spawn_batch(boards, rng, probabilities=SPAWN_PROBABILITIES, opening=False):
+    # Vectorized fill_two_or_four for a uint64 array of packed boards and a
+    # numpy Generator: one tile per board, every board needs an empty cell.
+    # With opening every spawn is a 2.
+    import numpy as np
+    shifts = np.arange(0, 64, 4, dtype=np.uint64)
+    exponents = (boards[:, None] >> shifts) & np.uint64(0xF)
+    empty = exponents == 0
+    counts = empty.sum(axis=1)
+    target = (rng.random(len(boards)) * counts).astype(np.int64)
+    cells = (np.cumsum(empty, axis=1) > target[:, None]).argmax(axis=1)
+    values = np.array([value.bit_length() - 1 for value, _ in probabilities], dtype=np.uint64)
+    thresholds = np.cumsum([prob for _, prob in probabilities])
+    choice = np.minimum(np.searchsorted(thresholds, rng.random(len(boards)), side="right"), len(values) - 1)
+    spawned = values[choice]
+    if opening:
+        spawned[:] = 1
+    else:
+        values_on_board = np.where(exponents > 0, np.uint64(1) << exponents, np.uint64(0)).sum(axis=1)
+        spawned[values_on_board <= 2] = 1
+    return boards | (spawned << shifts[cells])
+
+
+class SpawnEngine:
+    # The spawns of one game: a private generator seeded once, so a game is
+    # reproduced by its seed alone whatever else uses `random`. spawn_batch
+    # draws from a numpy generator seeded the same way, created (and numpy
+    # imported) on its first use.
+    def __init__(self, seed=None, probabilities=SPAWN_PROBABILITIES):
+        self.seed = seed
+        self.probabilities = probabilities
+        self.rng = random.Random(seed)
+        self._np_rng = None
+
+    @property
+    def np_rng(self):
+        if self._np_rng is None:
+            import numpy as np
+            self._np_rng = np.random.default_rng(self.seed)
+        return self._np_rng
+
+    def new_board(self):
+        return self.spawn(0, iter=2)
+
+    def spawn(self, board, iter=1):
+        return fill_two_or_four(board, iter, self.rng, self.probabilities)
+
+    def spawn_batch(self, boards, opening=False):
+        return spawn_batch(boards, self.np_rng, self.probabilities, opening)
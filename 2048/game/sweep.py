@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .expectimax_agent import EVAL_WEIGHTS
+from .tournament import _play, summarize
+
+# A search space maps agent parameters to candidate values, with the
+# evaluator weights nested under "weights":
+#
+#   {"depth": [2, 3], "weights": {"snake": [0.3, 0.5], "smoothness": [0, 0.5]}}
+#
+# A grid search plays every combination. A random search draws `samples`
+# configurations: one value of every parameter list, and a weight uniformly
+# from [low, high] (rounded to 3 decimals) for each weights entry. Weights
+# not in the space keep their EVAL_WEIGHTS values. Duplicate configurations
+# share their games.
+MODES = ("grid", "random")
+RANKINGS = ("score", "time")
+
+
+def grid_configs(space):
+    params = {name: values for name, values in space.items() if name != "weights"}
+    weights = space.get("weights", {})
+    configs = []
+    for values in itertools.product(*params.values()):
+        for weight_values in itertools.product(*weights.values()):
+            config = dict(zip(params, values))
+            if "weights" in space:
+                config["weights"] = dict(EVAL_WEIGHTS, **dict(zip(weights, weight_values)))
+            configs.append(config)
+    return configs
+
+
+def random_configs(space, samples, seed=0):
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(samples):
+        config = {name: rng.choice(values) for name, values in space.items() if name != "weights"}
+        if "weights" in space:
+            config["weights"] = dict(EVAL_WEIGHTS, **{name: round(rng.uniform(low, high), 3)
+                                                      for name, (low, high) in space["weights"].items()})
+        configs.append(config)
+    return configs
+
+
+def config_key(ai_mode, params, max_tile, time_budget):
+    spec = {"agent": ai_mode, "params": params, "max_tile": max_tile, "time_budget": time_budget}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ResultCache:
+    # Game results keyed on (config key, seed), appended to a JSON lines
+    # file as each game finishes. An interrupted sweep leaves at most one
+    # partial line behind, which is skipped when the file is loaded.
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        line = "\n"
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.results[(row["key"], row["seed"])] = row["result"]
+        self.file = open(path, "a") if path is not None else None
+        if self.file is not None and not line.endswith("\n"):
+            self.file.write("\n")
+
+    def __contains__(self, item):
+        return item in self.results
+
+    def get(self, key, seed):
+        return self.results.get((key, seed))
+
+    def add(self, key, config, seed, result):
+        self.results[(key, seed)] = result
+        if self.file is not None:
+            self.file.write(json.dumps({"key": key, "config": config, "seed": seed, "result": result}) + "\n")
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def run_sweep(configs, games=10, seed=0, ai_mode="expectimax", agent_params=None, max_tile=2048, time_budget=None,
+              workers=None, cache=None, progress=None):
+    # Plays games seeded seed..seed + games - 1 for every configuration and
+    # returns one summary per configuration (see rank). Every configuration
+    # plays the same seeds, so they are compared on the same spawns. Games
+    # found in cache are not played again; progress, if given, is called
+    # with (config, result) for every game played.
+    cache = cache if cache is not None else ResultCache(None)
+    runs = []
+    for config in configs:
+        params = dict(agent_params or {}, **config)
+        runs.append((config, params, config_key(ai_mode, params, max_tile, time_budget)))
+    todo = {(key, s): (config, params) for config, params, key in runs for s in range(seed, seed + games)
+            if (key, s) not in cache}
+    if todo:
+        executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        try:
+            pending = {executor.submit(_play, ai_mode, s, max_tile, params, time_budget): (config, key, s)
+                       for (key, s), (config, params) in todo.items()}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    config, key, s = pending.pop(future)
+                    result = future.result()
+                    cache.add(key, config, s, result)
+                    if progress is not None:
+                        progress(config, result)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    summaries = []
+    for config, params, key in runs:
+        results = [cache.get(key, s) for s in range(seed, seed + games)]
+        summary = summarize(results)
+        summary["time_per_move_ms"] = (1000 * sum(result["time_s"] for result in results) /
+                                       max(1, sum(result["moves"] for result in results)))
+        summaries.append({"key": key, "config": config, **summary})
+    return summaries
+
+
+def rank(summaries, by="score"):
+    # Best first: by mean score (ties by time per move), or by time per move
+    # (ties by mean score). pareto marks configurations no other one beats on
+    # both score and time per move.
+    for summary in summaries:
+        summary["pareto"] = not any(
+            other["mean_score"] >= summary["mean_score"] and other["time_per_move_ms"] <= summary["time_per_move_ms"]
+            and (other["mean_score"], other["time_per_move_ms"]) != (summary["mean_score"], summary["time_per_move_ms"])
+            for other in summaries)
+    if by == "time":
+        return sorted(summaries, key=lambda summary: (summary["time_per_move_ms"], -summary["mean_score"]))
+    return sorted(summaries, key=lambda summary: (-summary["mean_score"], summary["time_per_move_ms"]))
+
+
+def parse_param(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep agent parameters over seeded headless games.")
+    parser.add_argument("space", help="search space as JSON, or the path of a JSON file")
+    parser.add_argument("--mode", choices=MODES, default="grid")
+    parser.add_argument("--samples", type=int, default=20, help="configurations drawn by a random search")
+    parser.add_argument("--sample-seed", type=int, default=0, help="seed of the random search's draws")
+    parser.add_argument("--agent", default="expectimax")
+    parser.add_argument("--param", action="append", default=[], type=parse_param, metavar="KEY=VALUE",
+                        help="agent constructor argument shared by every configuration")
+    parser.add_argument("-n", "--games", type=int, default=10, help="games per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game k uses seed + k")
+    parser.add_argument("--max-tile", type=int, default=2048)
+    parser.add_argument("--time-budget", type=float, help="seconds after which a game is stopped")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--cache", default="sweep.jsonl", help="results file that an interrupted sweep resumes from")
+    parser.add_argument("--by", choices=RANKINGS, default="score")
+    parser.add_argument("--top", type=int, help="only print the best configurations")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.space):
+        with open(args.space) as f:
+            space = json.load(f)
+    else:
+        space = json.loads(args.space)
+    if args.mode == "grid":
+        configs = grid_configs(space)
+    else:
+        configs = random_configs(space, args.samples, args.sample_seed)
+
+    cache = ResultCache(args.cache)
+    try:
+        summaries = run_sweep(configs, args.games, args.seed, args.agent, dict(args.param), args.max_tile,
+                              args.time_budget, args.workers, cache)
+    finally:
+        cache.close()
+    for summary in rank(summaries, args.by)[:args.top]:
+        print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .engine import game_seeds, play_headless
+
+PERCENTILES = (10, 25, 75, 90, 99)
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0
+    position = (len(ordered) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(results):
+    scores = sorted(result["score"] for result in results)
+    if not scores:
+        return {"games": 0}
+    summary = {
+        "games": len(scores),
+        "mean_score": statistics.mean(scores),
+        "median_score": statistics.median(scores),
+        "min_score": scores[0],
+        "max_score": scores[-1],
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}_score"] = percentile(scores, p)
+    summary["max_tile_distribution"] = dict(sorted(Counter(result["max_tile"] for result in results).items()))
+    summary["status"] = dict(Counter(result["status"] for result in results))
+    summary["mean_move_ms"] = statistics.mean(result["mean_ms"] for result in results)
+    return summary
+
+
+_cancel = None
+
+
+def _start_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def _play(ai_mode, seed, max_tile, agent_params, time_budget):
+    return play_headless(ai_mode, seed, max_tile, agent_params, time_budget=time_budget, cancel=_cancel)
+
+
+def iter_tournament(num_games, ai_mode="expectimax", seed=0, max_tile=2048, agent_params=None, seeds=None,
+                    workers=None, time_budget=None, cancel=None):
+    # Yields game results in completion order. Game k always gets the same
+    # seed, so the set of results does not depend on the number of workers.
+    # Setting the `cancel` event (or closing the generator) drops every game
+    # that has not started yet and stops the running ones after their
+    # current move, through an event shared with the workers.
+    seeds = game_seeds(num_games, seed, seeds)
+    stop = multiprocessing.Event()
+    executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_start_worker,
+                                   initargs=(stop,))
+    try:
+        pending = {executor.submit(_play, ai_mode, s, max_tile, agent_params, time_budget) for s in seeds}
+        while pending:
+            if cancel is not None and cancel.is_set():
+                break
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_tournament(num_games, ai_mode="expectimax", seed=0, max_tile=2048, agent_params=None, seeds=None,
+                   workers=None, time_budget=None, cancel=None):
+    results = list(iter_tournament(num_games, ai_mode, seed, max_tile, agent_params, seeds,
+                                   workers, time_budget, cancel))
+    results.sort(key=lambda result: result["seed"])
+    return results, summarize(results)
@@ -0,0 +1,176 @@
+import struct
+from collections import OrderedDict
+
+POLICIES = ("lru", "depth")
+
+# Approximate cost of one entry (key and value tuples, packed board int and
+# the container slot), used to turn a memory cap in megabytes into entries.
+ENTRY_BYTES = 280
+
+
+class TranspositionTable:
+    # Caches search values keyed on (packed board, remaining depth, node type).
+    #
+    # "lru" keeps the max_entries most recently used positions. "depth" is a
+    # fixed array of max_entries slots addressed by the key's hash, where a
+    # new entry only replaces a slot holding a shallower (cheaper) search.
+    def __init__(self, max_entries=1 << 18, policy="lru"):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown replacement policy {policy!r}, expected one of {POLICIES}")
+        self.max_entries = max_entries
+        self.policy = policy
+        self.clear()
+        self.reset_stats()
+
+    @classmethod
+    def from_megabytes(cls, megabytes, policy="lru"):
+        return cls(max(1, int(megabytes * 2**20 // ENTRY_BYTES)), policy)
+
+    def clear(self):
+        self.entries = OrderedDict() if self.policy == "lru" else [None] * self.max_entries
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def __len__(self):
+        if self.policy == "lru":
+            return len(self.entries)
+        return sum(entry is not None for entry in self.entries)
+
+    def get(self, board, depth, is_maximizing):
+        key = (board, depth, is_maximizing)
+        if self.policy == "lru":
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        else:
+            entry = self.entries[hash(key) % self.max_entries]
+            if entry is not None and entry[0] != key:
+                entry = None
+            elif entry is not None:
+                entry = entry[1]
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, board, depth, is_maximizing, value):
+        key = (board, depth, is_maximizing)
+        self.stores += 1
+        if self.policy == "lru":
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            return
+        slot = hash(key) % self.max_entries
+        current = self.entries[slot]
+        if current is not None and current[0] != key:
+            if current[0][1] > depth:
+                self.rejections += 1
+                return
+            self.evictions += 1
+        self.entries[slot] = (key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "policy": self.policy,
+            "max_entries": self.max_entries,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+        }
+
+
+class SharedTranspositionTable:
+    # A depth-preferred table of max_entries slots in a shared_memory block,
+    # read and written by several processes without locks. A slot is three
+    # uint64 words: check, value (float64 bits) and meta (depth << 2 |
+    # is_maximizing << 1 | 1). check is board ^ value bits ^ meta, so a slot
+    # torn by two concurrent writers fails verification and reads as a miss.
+    # The creating process owns the block (see close()); others attach to it
+    # by name.
+    def __init__(self, max_entries=1 << 18, name=None):
+        self.max_entries = max_entries
+        self.owner = name is None
+        from multiprocessing import shared_memory
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=24 * max_entries)
+        self.words = self.memory.buf.cast("Q")
+        self.values = self.memory.buf.cast("d")
+        self.name = self.memory.name
+        self.policy = "shared"
+        if self.owner:
+            self.clear()
+        self.reset_stats()
+
+    def clear(self):
+        self.memory.buf[:24 * self.max_entries] = bytes(24 * self.max_entries)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def __len__(self):
+        return sum(1 for slot in range(self.max_entries) if self.words[3 * slot + 2])
+
+    def get(self, board, depth, is_maximizing):
+        meta = depth << 2 | is_maximizing << 1 | 1
+        base = 3 * (hash((board, depth, is_maximizing)) % self.max_entries)
+        words = self.words
+        check, bits, current = words[base], words[base + 1], words[base + 2]
+        # The value is decoded from the verified bits: reading it again could
+        # return another writer's value under this board's key.
+        if current == meta and check == board ^ bits ^ meta:
+            self.hits += 1
+            return struct.unpack("d", struct.pack("Q", bits))[0]
+        self.misses += 1
+        return None
+
+    def store(self, board, depth, is_maximizing, value):
+        meta = depth << 2 | is_maximizing << 1 | 1
+        base = 3 * (hash((board, depth, is_maximizing)) % self.max_entries)
+        words = self.words
+        self.stores += 1
+        current = words[base + 2]
+        if current and words[base] != board ^ words[base + 1] ^ current:
+            if current >> 2 > depth:
+                self.rejections += 1
+                return
+            self.evictions += 1
+        self.values[base + 1] = float(value)
+        words[base + 2] = meta
+        words[base] = board ^ words[base + 1] ^ meta
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "policy": self.policy,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+        }
+
+    def close(self):
+        self.words.release()
+        self.values.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
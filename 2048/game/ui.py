@@ -1,7 +1,9 @@
+import json
+import sys
 import pygame
 from pygame.locals import *
-import statistics
 from .game import run_games
+from .tournament import summarize
 
 class Button:
     def __init__(self, colour, x, y, width, height, text=""):
@@ -11,12 +13,20 @@ class Button:
         self.width = width
         self.height = height
         self.text = text
+        self.surface = None
+
+    def render(self, text_col, font, constants):
+        # The button (rounded rect and label) on its own surface, drawn once.
+        if self.surface is None:
+            self.surface = pygame.Surface((self.width, self.height), SRCALPHA)
+            draw_round_rect(self.surface, self.colour, (0, 0, self.width, self.height), constants)
+            if self.text != "":
+                text = font.render(self.text, 1, text_col)
+                self.surface.blit(text, (self.width / 2 - text.get_width() / 2, self.height / 2 - text.get_height() / 2))
+        return self.surface
 
     def draw(self, win, text_col, font, constants):
-        draw_round_rect(win, self.colour, (self.x, self.y, self.width, self.height), constants)
-        if self.text != "":
-            text = font.render(self.text, 1, text_col)
-            win.blit(text, (self.x + (self.width / 2 - text.get_width() / 2), self.y + (self.height / 2 - text.get_height() / 2)))
+        win.blit(self.render(text_col, font, constants), (self.x, self.y))
 
     def is_over(self, pos):
         if self.x < pos[0] < self.x + self.width and self.y < pos[1] < self.y + self.height:
@@ -74,16 +84,19 @@ def show_menu(constants, screen, my_font):
     }
 
     label = my_font.render("Select AI Mode:", True, tuple(constants["colour"][theme]["dark"]))
+    icon = pygame.transform.scale(pygame.image.load("images/icon.ico"), (200, 200))
+    clock = pygame.time.Clock()
 
-    while True:
-        screen.fill(tuple(constants["colour"][theme]["background"]))
-        screen.blit(pygame.transform.scale(pygame.image.load("images/icon.ico"), (200, 200)), (155, 50))
-        screen.blit(label, (first_button_x, 325))
-
-        for button in buttons.values():
-            button.draw(screen, tuple(constants["colour"][theme]["dark"]), my_font, constants)
+    # The menu is static, so it is drawn once; the loop only polls events.
+    screen.fill(tuple(constants["colour"][theme]["background"]))
+    screen.blit(icon, (155, 50))
+    screen.blit(label, (first_button_x, 325))
+    for button in buttons.values():
+        button.draw(screen, tuple(constants["colour"][theme]["dark"]), my_font, constants)
+    pygame.display.update()
 
-        pygame.display.update()
+    while True:
+        clock.tick(constants.get("fps", 60))
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_q):
@@ -100,8 +113,8 @@ def show_menu(constants, screen, my_font):
                             ai_mode_selected = True
 
                         if key == "start" and ai_mode_selected:
-                            scores = run_games(10, theme, difficulty, ai_mode)
-                            average_score = statistics.mean(scores)
-                            print(f"Average score for {ai_mode}: {average_score}")
-                            print(f"All scores for {ai_mode}: ", scores)
+                            # Reported like simulate.py reports a run.
+                            results = run_games(10, theme, difficulty, ai_mode)
+                            print(json.dumps(dict(agent=ai_mode, **summarize(results))))
+                            print(f"All scores for {ai_mode}: ", [result["score"] for result in results])
                             return
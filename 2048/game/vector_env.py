@@ -0,0 +1,143 @@
+import numpy as np
+from . import bitboard
+from .spawn import SPAWN_PROBABILITIES, spawn_batch
+
+# Numpy copies of the bitboard row tables, so K packed boards (a uint64
+# array) can be moved with a handful of gathers per direction.
+_ROW_LEFT = np.array(bitboard.ROW_LEFT, dtype=np.uint64)
+_ROW_RIGHT = np.array(bitboard.ROW_RIGHT, dtype=np.uint64)
+_SCORE_LEFT = np.array(bitboard.SCORE_LEFT, dtype=np.int64)
+_SCORE_RIGHT = np.array(bitboard.SCORE_RIGHT, dtype=np.int64)
+_ROW_TO_COL = np.array(bitboard.ROW_TO_COL, dtype=np.uint64)
+_ROW_MASK = np.uint64(bitboard.ROW_MASK)
+_ROW_SHIFTS = [np.uint64(16 * i) for i in range(4)]
+_COL_SHIFTS = [np.uint64(4 * i) for i in range(4)]
+_CELL_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+ACTIONS = bitboard.ACTIONS
+REWARDS = ("merge",)
+
+
+def _lines(boards):
+    return [((boards >> shift) & _ROW_MASK).astype(np.intp) for shift in _ROW_SHIFTS]
+
+
+def transpose(boards):
+    result = np.zeros_like(boards)
+    for line, shift in zip(_lines(boards), _COL_SHIFTS):
+        result |= _ROW_TO_COL[line] << shift
+    return result
+
+
+def exponents(boards):
+    # (K, 16) tile exponents, cell (i, j) at column 4 * i + j.
+    return ((boards[:, None] >> _CELL_SHIFTS) & np.uint64(0xF)).astype(np.int64)
+
+
+def tile_sums(boards):
+    cells = exponents(boards)
+    return np.where(cells > 0, 1 << cells, 0).sum(axis=1)
+
+
+def max_exponents(boards):
+    return exponents(boards).max(axis=1)
+
+
+def successors(boards):
+    # All four moves of every board, in ACTIONS order: (K, 4) new boards and
+    # (K, 4) merge scores. A move is legal where the new board differs.
+    rows = _lines(boards)
+    cols = _lines(transpose(boards))
+    new_boards = np.zeros((len(boards), 4), dtype=np.uint64)
+    scores = np.zeros((len(boards), 4), dtype=np.int64)
+    for col, shift in zip(cols, _COL_SHIFTS):
+        new_boards[:, 0] |= _ROW_TO_COL[_ROW_LEFT[col].astype(np.intp)] << shift
+        new_boards[:, 2] |= _ROW_TO_COL[_ROW_RIGHT[col].astype(np.intp)] << shift
+        scores[:, 0] += _SCORE_LEFT[col]
+        scores[:, 2] += _SCORE_RIGHT[col]
+    for row, shift in zip(rows, _ROW_SHIFTS):
+        new_boards[:, 1] |= _ROW_LEFT[row] << shift
+        new_boards[:, 3] |= _ROW_RIGHT[row] << shift
+        scores[:, 1] += _SCORE_LEFT[row]
+        scores[:, 3] += _SCORE_RIGHT[row]
+    return new_boards, scores
+
+
+class VectorEnv:
+    # K games of 2048 stepped together. Boards are packed uint64s (see
+    # game.bitboard) and actions are indices into ACTIONS. step() returns
+    # (boards, rewards, dones, masks, info): masks[k, a] says whether action
+    # a is legal on the new boards[k]. Illegal actions leave a board as it is
+    # with reward 0, like the engine's game loop.
+    #
+    # reward="merge" is the merge score, the qlearning reward of
+    # game.engine.play_headless. Finished games (no legal move, or max_tile reached) are
+    # reported in info and replaced by a fresh game in the same step, so
+    # every step advances all K boards. Spawns follow probabilities (see
+    # game.spawn) and are drawn from a numpy generator seeded with seed.
+    def __init__(self, num_envs, seed=None, max_tile=2048, reward="merge", probabilities=SPAWN_PROBABILITIES):
+        if reward not in REWARDS:
+            raise ValueError(f"reward must be one of {REWARDS}")
+        self.num_envs = num_envs
+        self.max_exponent = max_tile.bit_length() - 1
+        self.reward = reward
+        self.probabilities = probabilities
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        self.boards = self._new_boards(self.num_envs)
+        self.moves = np.zeros(self.num_envs, dtype=np.int64)
+        self.returns = np.zeros(self.num_envs, dtype=np.int64)
+        self.episodes = 0
+        self._successors, self._scores = successors(self.boards)
+        return self.boards.copy(), self.masks
+
+    def _new_boards(self, count):
+        boards = np.zeros(count, dtype=np.uint64)
+        for _ in range(2):
+            boards = spawn_batch(boards, self.rng, self.probabilities, opening=True)
+        return boards
+
+    @property
+    def masks(self):
+        return self._successors != self.boards[:, None]
+
+    def sample_actions(self, masks=None):
+        # A uniformly random legal action for every board.
+        masks = self.masks if masks is None else masks
+        weights = self.rng.random(masks.shape) * masks
+        return weights.argmax(axis=1)
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.intp)
+        index = np.arange(self.num_envs)
+        moved = self._successors[index, actions]
+        legal = moved != self.boards
+        rewards = np.where(legal, self._scores[index, actions], 0)
+
+        if legal.any():
+            self.boards[legal] = spawn_batch(moved[legal], self.rng, self.probabilities)
+        self.moves += legal
+        self.returns += rewards
+        self._successors, self._scores = successors(self.boards)
+        masks = self.masks
+        dones = ~masks.any(axis=1) | (max_exponents(self.boards) >= self.max_exponent)
+
+        info = {}
+        if dones.any():
+            finished = self.boards[dones]
+            info = {
+                "final_boards": finished,
+                "scores": tile_sums(finished),
+                "max_tiles": 1 << max_exponents(finished),
+                "moves": self.moves[dones].copy(),
+                "returns": self.returns[dones].copy(),
+            }
+            self.episodes += int(dones.sum())
+            self.boards[dones] = self._new_boards(int(dones.sum()))
+            self.moves[dones] = 0
+            self.returns[dones] = 0
+            self._successors[dones], self._scores[dones] = successors(self.boards[dones])
+            masks = self.masks
+        return self.boards.copy(), rewards, dones, masks, info
@@ -0,0 +1,66 @@
+import argparse
+import json
+from game.engine import AI_MODES, run_headless
+from game.instrumentation import SearchRecorder
+from game.tournament import iter_tournament, summarize
+
+
+def parse_param(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Play 2048 games headlessly and print per-game results as JSON lines.")
+    parser.add_argument("--agent", choices=AI_MODES, action="append",
+                        help="agent to evaluate; repeat to play several agents (default: expectimax)")
+    parser.add_argument("-n", "--games", type=int, default=10, help="games per agent")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game k uses seed + k")
+    parser.add_argument("--seeds", type=lambda text: [int(s) for s in text.split(",")],
+                        help="comma separated list of seeds, overrides --games and --seed")
+    parser.add_argument("--max-tile", type=int, default=2048, help="tile that wins the game")
+    parser.add_argument("--param", action="append", default=[], type=parse_param, metavar="KEY=VALUE",
+                        help="agent constructor argument, e.g. --param depth=3")
+    parser.add_argument("--workers", type=int, help="play games in this many worker processes")
+    parser.add_argument("--time-budget", type=float, help="seconds after which a game is stopped")
+    parser.add_argument("--instrument", action="store_true",
+                        help="record search statistics and add a per-game search report to each result")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write per-move search records to PATH (.csv for CSV, JSON lines otherwise)")
+    parser.add_argument("--record", metavar="PATH", help="write every game to a binary game record file at PATH")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    agent_params = dict(args.param)
+    recorder = SearchRecorder() if args.instrument or args.trace else None
+    if args.workers and (recorder is not None or args.record):
+        raise SystemExit("--instrument, --trace and --record are not supported with --workers")
+    writer = None
+    if args.record:
+        from game.records import RecordWriter
+        writer = RecordWriter(args.record)
+    for ai_mode in args.agent or ["expectimax"]:
+        if args.workers:
+            results = iter_tournament(args.games, ai_mode, args.seed, args.max_tile, agent_params, args.seeds,
+                                      args.workers, args.time_budget)
+        else:
+            results = run_headless(args.games, ai_mode, args.seed, args.max_tile, agent_params, args.seeds,
+                                   args.time_budget, recorder, writer)
+        finished = []
+        for result in results:
+            print(json.dumps(result), flush=True)
+            finished.append(result)
+        print(json.dumps(dict(agent=ai_mode, **summarize(finished))))
+    if args.trace:
+        recorder.write(args.trace)
+    if writer is not None:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import pytest
+from ai.ai_agent import AI2048
+from benchmarks.corpus import board_corpus
+from game import bitboard
+from game.logic import check_game_status, successors
+
+BOARDS = [bitboard.unpack_board(board) for board in board_corpus(40, seed=11) if bitboard.max_tile(board) < 1024]
+
+
+def best_values(agent, board, remaining):
+    # Exhaustive version of the planner's objective: the best merge score of
+    # `remaining` moves under its spawn model, per first move.
+    values = {}
+    for move, new_board, score in successors(board):
+        child = agent.spawn(new_board)
+        if check_game_status(child, agent.max_tile) == "LOSE":
+            values[move] = score - agent.loss_penalty
+        elif remaining == 1:
+            values[move] = score
+        else:
+            values[move] = score + max(best_values(agent, child, remaining - 1).values(), default=0)
+    return values
+
+
+@pytest.mark.parametrize("horizon", [1, 2, 3])
+def test_astar_move_is_optimal(horizon):
+    agent = AI2048("a*", horizon=horizon, max_nodes=10**6)
+    for board in BOARDS:
+        values = best_values(agent, board, horizon)
+        move = agent.get_move([row[:] for row in board])
+        assert move in values
+        assert values[move] == max(values.values())
+
+
+def node(k):
+    return [[2, 2, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, k]]
+
+
+class GraphPlanner(AI2048):
+    # A* over a fixed move graph with a heuristic that reaches Z by the
+    # worse path (through X, g = 1) before the better one (through Y, g = 10).
+    R, X, Y, Z, L = (node(k) for k in (4, 8, 16, 32, 64))
+    EDGES = {4: [("a", X, 1), ("w", Y, 10)], 8: [("d", Z, 0)], 16: [("d", Z, 0)], 32: [("s", L, 5)]}
+    ESTIMATES = {8: 500, 16: 200, 32: 300}
+
+    def possible_moves(self, board):
+        return self.EDGES.get(board[3][3], [])
+
+    def spawn(self, board):
+        return board
+
+    def heuristic(self, board, remaining):
+        return self.ESTIMATES.get(board[3][3], 0)
+
+
+def test_astar_reexpands_a_board_reached_with_a_better_g():
+    planner = GraphPlanner("a*", horizon=3)
+    assert planner.get_move(GraphPlanner.R) == "w"
+    assert planner.expanded == 5  # R, X, Z (g = 1), Y, Z (g = 10)
+
+
+def test_astar_is_deterministic():
+    for board in BOARDS:
+        moves = {AI2048("a*").get_move([row[:] for row in board]) for _ in range(3)}
+        assert len(moves) == 1
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from benchmarks.corpus import board_corpus
+from game import bitboard
+from game.batch_eval import check_against_scalar
+from game.expectimax_agent import EVAL_WEIGHTS
+
+BOARDS = board_corpus(200, seed=5)
+
+
+@pytest.mark.parametrize("weights", [
+    EVAL_WEIGHTS,
+    dict(EVAL_WEIGHTS, empty_tiles=0.5, merge_potential=0.25),
+    {name: 1.0 for name in EVAL_WEIGHTS},
+])
+def test_packed_boards_match_scalar(weights):
+    assert check_against_scalar(np.array(BOARDS, dtype=np.uint64), weights) == len(BOARDS)
+
+
+def test_tile_value_boards_match_scalar():
+    values = np.array([bitboard.unpack_board(board) for board in BOARDS], dtype=np.int64)
+    assert check_against_scalar(values) == len(BOARDS)
@@ -0,0 +1,48 @@
+import pytest
+from benchmarks.corpus import board_corpus
+from game import bitboard
+from game.expectimax_agent import ExpectimaxAgent, SearchTimeout
+
+BOARD = next(board for board in board_corpus(20, seed=2) if len(bitboard.successors(board)) >= 3)
+
+
+class ScriptedAgent(ExpectimaxAgent):
+    # Root children score as in values[depth][action]; the search times out
+    # once `timeout_after` root children of the deepest iteration are scored.
+    def __init__(self, values, timeout_after):
+        super().__init__(time_budget=60, max_depth=2)
+        self.values = values
+        self.timeout_after = timeout_after
+        self.action_of = {new_board: action for action, new_board, _ in bitboard.successors(BOARD)}
+        self.scored = 0
+
+    def expectimax(self, board, depth, is_maximizing, prob=1.0, partials=None):
+        if depth == 2:
+            if self.scored == self.timeout_after:
+                raise SearchTimeout()
+            self.scored += 1
+        return self.values[depth][self.action_of[board]]
+
+
+def scripted_values(deeper):
+    actions = [action for action, _, _ in bitboard.successors(BOARD)]
+    shallow = {action: len(actions) - rank for rank, action in enumerate(actions)}
+    return {1: shallow, 2: dict(zip(actions, deeper))}, actions
+
+
+def test_partial_iteration_overrides_the_previous_best():
+    values, actions = scripted_values([1.0, 5.0, 0.0, 0.0])
+    assert ScriptedAgent(values, timeout_after=2).choose_move(bitboard.unpack_board(BOARD)) == actions[1]
+
+
+def test_partial_iteration_without_the_previous_best_is_ignored():
+    values, actions = scripted_values([1.0, 5.0, 0.0, 0.0])
+    assert ScriptedAgent(values, timeout_after=0).choose_move(bitboard.unpack_board(BOARD)) == actions[0]
+
+
+@pytest.mark.parametrize("adaptive_depth", [False, True])
+def test_time_budget_moves_are_legal(adaptive_depth):
+    agent = ExpectimaxAgent(time_budget=0.02, adaptive_depth=adaptive_depth)
+    for board in board_corpus(10, seed=4):
+        legal = {action for action, _, _ in bitboard.successors(board)}
+        assert agent.getNextBestMoveExpectiminimax(bitboard.unpack_board(board)) in legal
@@ -0,0 +1,37 @@
+import random
+import pytest
+from benchmarks.corpus import board_corpus
+from game import bitboard
+from game.expectimax_agent import EVAL_WEIGHTS, ExpectimaxAgent
+from game.incremental_eval import IncrementalEvaluator
+from game.spawn import SpawnEngine
+
+WEIGHTS = [EVAL_WEIGHTS, {name: 1.0 for name in EVAL_WEIGHTS}]
+
+
+@pytest.mark.parametrize("weights", WEIGHTS)
+def test_partials_follow_seeded_games(weights):
+    # debug makes every value() compare against a full evaluation.
+    evaluator = IncrementalEvaluator(weights, debug=True)
+    for seed in range(5):
+        rng = random.Random(seed)
+        spawner = SpawnEngine(seed)
+        board = spawner.new_board()
+        partials = evaluator.full(board)
+        evaluator.value(partials, board)
+        while bitboard.check_game_status(board) == "PLAY":
+            _, moved, _ = rng.choice(bitboard.successors(board))
+            partials = evaluator.update(partials, moved)
+            evaluator.value(partials, moved)
+            board = spawner.spawn(moved)
+            shift = next(shift for shift in range(0, 64, 4) if (board ^ moved) >> shift & 0xF)
+            partials = evaluator.spawn(partials, board, shift)
+            evaluator.value(partials, board)
+
+
+def test_debug_search_matches_plain_search():
+    plain = ExpectimaxAgent(depth=2, batch_leaves=False)
+    debug = ExpectimaxAgent(depth=2, batch_leaves=False, debug_incremental=True)
+    for packed in board_corpus(20, seed=3):
+        board = bitboard.unpack_board(packed)
+        assert debug.getNextBestMoveExpectiminimax(board) == plain.getNextBestMoveExpectiminimax(board)
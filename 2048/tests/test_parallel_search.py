@@ -0,0 +1,36 @@
+import pytest
+from benchmarks.corpus import board_corpus
+from game import bitboard
+from game.engine import play_headless
+from game.expectimax_agent import ExpectimaxAgent
+from game.parallel_search import ParallelExpectimaxAgent
+
+BOARDS = board_corpus(12, seed=7)
+
+
+@pytest.mark.parametrize("split_chance", [False, True])
+def test_parallel_matches_serial(split_chance):
+    serial = ExpectimaxAgent(depth=2)
+    parallel = ParallelExpectimaxAgent(workers=2, split_chance=split_chance, depth=2)
+    try:
+        for board in BOARDS:
+            assert parallel.search_root(board, 2) == serial.search_root(board, 2)
+    finally:
+        parallel.close()
+
+
+def test_shared_table_agent_survives_close():
+    agent = ParallelExpectimaxAgent(workers=2, shared_tt=4096, depth=2)
+    try:
+        first = play_headless("expectimax", seed=1, max_tile=64, agent=agent)
+        second = play_headless("expectimax", seed=1, max_tile=64, agent=agent)
+        serial = play_headless("expectimax", seed=1, max_tile=64, agent_params={"depth": 2})
+        assert first["status"] == second["status"] == serial["status"] == "WIN"
+        assert first["moves"] == second["moves"] == serial["moves"]
+    finally:
+        agent.close()
+
+
+def test_evaluator_objects_are_rejected():
+    with pytest.raises(ValueError):
+        ParallelExpectimaxAgent(workers=2, evaluator=ExpectimaxAgent(depth=1))
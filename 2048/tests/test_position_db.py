@@ -0,0 +1,51 @@
+from collections import Counter
+import pytest
+from game import bitboard
+from game.expectimax_agent import ExpectimaxAgent
+from game.position_db import ENTRY_BYTES, HEADER_BYTES, PositionDB, build, count_positions, select_positions
+
+DEPTH = 2
+
+
+@pytest.fixture(scope="module")
+def positions():
+    counts = count_positions(40, "random", seed=0, max_moves=6)
+    return select_positions(counts, min_count=2)
+
+
+@pytest.fixture(scope="module")
+def db_path(positions, tmp_path_factory):
+    return build(positions, depth=DEPTH).save(str(tmp_path_factory.mktemp("db") / "positions.db"))
+
+
+def test_positions_are_canonical_and_frequent(positions):
+    assert positions
+    assert all(bitboard.canonical(board)[0] == board and count >= 2 for board, count in positions)
+    assert [count for _, count in positions] == sorted((count for _, count in positions), reverse=True)
+    counts = Counter(dict(positions))
+    assert select_positions(counts, max_bytes=HEADER_BYTES + 3 * ENTRY_BYTES, min_count=0) == positions[:3]
+
+
+def test_build_then_lookup(positions, db_path):
+    db = PositionDB.load(db_path)
+    assert len(db) == len(positions)
+    agent = ExpectimaxAgent(depth=DEPTH)
+    for key, _ in positions:
+        # Every orientation gets its own move: the one a search of it plays.
+        for index in range(8):
+            board = bitboard.symmetry(key, index)
+            action, scores = agent.search_root(board, DEPTH)
+            stored = db.lookup(board)
+            assert stored[:2] == (action, DEPTH)
+        assert stored[2] == pytest.approx(agent.search_root(key, DEPTH)[1][db.lookup(key)[0]])
+        assert db.lookup(key, min_depth=DEPTH + 1) is None
+    assert db.lookup(0x1234) is None
+
+
+def test_agent_plays_stored_moves(positions, db_path):
+    db = PositionDB.load(db_path)
+    agent = ExpectimaxAgent(depth=1, position_db=db_path)
+    for key, _ in positions:
+        assert agent.getNextBestMoveExpectiminimax(bitboard.unpack_board(key)) == db.lookup(key)[0]
+        assert agent.completed_depth == DEPTH
+    assert agent.position_db.stats()["hits"] == len(positions)
@@ -0,0 +1,60 @@
+import numpy as np
+from ai.qlearning_agent import QLearningAgent
+from ai.qtable import QTable
+from benchmarks.corpus import board_corpus
+from game import bitboard
+
+BOARDS = board_corpus(50, seed=9)
+
+
+def filled(table, boards, start=0):
+    for k, board in enumerate(boards, start):
+        row = table.row(board, create=True)
+        row[k % 4] = k
+    return table
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "q.bin")
+    saved = filled(QTable(), BOARDS[:30])
+    saved.save(path)
+    loaded = filled(QTable.load(path), BOARDS[30:], 30)
+    assert len(loaded) == len(BOARDS)
+    for board in BOARDS[:30]:
+        assert np.array_equal(loaded.row(board), saved.row(board), equal_nan=True)
+    # Untried actions stay NaN, and states added after loading are saved too.
+    loaded.save(path)
+    again = QTable.load(path)
+    for k, board in enumerate(BOARDS):
+        row = again.row(board)
+        assert row[k % 4] == k and np.isnan(np.delete(row, k % 4)).all()
+    assert again.row(0x1) is None
+
+
+def test_writable_table_updates_the_file(tmp_path):
+    path = str(tmp_path / "q.bin")
+    filled(QTable(), BOARDS).save(path)
+    table = QTable.load(path, writable=True)
+    table.row(BOARDS[0])[3] = -1.5
+    table.base_values.flush()
+    assert QTable.load(path).row(BOARDS[0])[3] == -1.5
+
+
+def test_max_states():
+    table = QTable(max_states=10)
+    assert all(table.row(board, create=True) is not None for board in BOARDS[:10])
+    assert table.row(BOARDS[10], create=True) is None
+    assert len(table) == 10
+
+
+def test_symmetric_states_share_a_row():
+    agent = QLearningAgent(list(bitboard.ACTIONS), epsilon=0, symmetric=True)
+    for board in BOARDS:
+        action, afterstate, score = bitboard.successors(board)[0]
+        agent.learn(agent.packed_state(board), action, score + 1, agent.packed_state(afterstate))
+        for index in range(8):
+            image = bitboard.symmetry(board, index)
+            best = agent.get_best_action(agent.packed_state(image))
+            # The action learnt on board, as played on its image.
+            assert bitboard.move(best, image) == bitboard.symmetry(afterstate, index)
+    assert len(agent.q_table) <= len(BOARDS)
@@ -0,0 +1,43 @@
+import pytest
+from game import bitboard
+from game.engine import play_headless
+from game.records import RecordWriter, index_games, iter_batches, iter_games, read_game
+
+
+@pytest.fixture
+def games(tmp_path):
+    path = tmp_path / "games.rec"
+    with RecordWriter(path) as writer:
+        results = [play_headless("random", seed, max_tile=128, writer=writer) for seed in range(4)]
+    return path, results
+
+
+def test_games_round_trip(games):
+    path, results = games
+    index = index_games(path)
+    assert [seed for _, seed, _, _ in index] == [result["seed"] for result in results]
+    for (offset, seed, moves, status), result in zip(index, results):
+        game = read_game(path, offset)
+        assert (game.seed, len(game), game.status) == (seed, moves, status) == (seed, result["moves"], result["status"])
+        assert bitboard.max_tile(game.final_board()) == result["max_tile"]
+        assert sum(score for _, _, _, score, _ in game.replay()) == result["merge_score"]
+        assert len(game.stats) == moves
+
+
+def test_batches_follow_the_games(games):
+    path, results = games
+    batches = list(iter_batches(iter_games(path), batch_size=100))
+    assert all(len(batch["boards"]) == 100 for batch in batches[:-1])
+    assert sum(int(batch["dones"].sum()) for batch in batches) == len(results)
+    assert sum(int(batch["rewards"].sum()) for batch in batches) == sum(result["merge_score"] for result in results)
+    for batch in batches:
+        assert (batch["rewards"] == batch["merge_scores"]).all()
+        for board, action, next_board in zip(batch["boards"], batch["actions"], batch["next_boards"]):
+            afterstate = bitboard.move(bitboard.ACTIONS[action], int(board))
+            assert afterstate != int(board) and int(next_board) & afterstate == afterstate
+
+
+def test_other_spawns_are_rejected(tmp_path):
+    with RecordWriter(tmp_path / "games.rec") as writer:
+        with pytest.raises(ValueError):
+            play_headless("random", 0, writer=writer, spawn_probabilities=((8, 1.0),))
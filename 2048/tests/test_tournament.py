@@ -0,0 +1,34 @@
+import multiprocessing
+import threading
+import time
+from game.engine import play_headless
+from game.tournament import iter_tournament, run_tournament
+
+
+def without_timings(results):
+    return [{name: value for name, value in result.items() if name != "time_s" and not name.endswith("_ms")}
+            for result in results]
+
+
+def test_results_do_not_depend_on_workers():
+    one, _ = run_tournament(4, "random", max_tile=128, workers=1)
+    two, summary = run_tournament(4, "random", max_tile=128, workers=2)
+    assert without_timings(one) == without_timings(two)
+    assert summary["games"] == 4
+
+
+def test_cancelled_game_stops():
+    cancel = threading.Event()
+    cancel.set()
+    assert play_headless("random", 0, cancel=cancel)["status"] == "CANCELLED"
+
+
+def test_cancel_stops_running_games():
+    cancel = threading.Event()
+    threading.Timer(1.0, cancel.set).start()
+    start = time.perf_counter()
+    results = list(iter_tournament(2, "expectimax", agent_params={"depth": 3}, workers=2, cancel=cancel))
+    while multiprocessing.active_children() and time.perf_counter() - start < 30:
+        time.sleep(0.1)
+    assert not multiprocessing.active_children()
+    assert all(result["status"] != "CANCELLED" for result in results)
@@ -0,0 +1,64 @@
+import pytest
+from game.transposition import SharedTranspositionTable
+
+
+@pytest.fixture
+def tables():
+    # One slot, so every key lands in it; other is attached by name.
+    owner = SharedTranspositionTable(1)
+    other = SharedTranspositionTable(1, owner.name)
+    yield owner, other
+    other.close()
+    owner.close()
+
+
+class PausedWriter:
+    # Words of a table whose read number `after` is followed by another
+    # process's store getting as far as writing its value word.
+    def __init__(self, words, after, write):
+        self.words = words
+        self.after = after
+        self.write = write
+        self.reads = 0
+
+    def __getitem__(self, index):
+        word = self.words[index]
+        self.reads += 1
+        if self.reads == self.after:
+            self.write()
+        return word
+
+    def __setitem__(self, index, word):
+        self.words[index] = word
+
+
+def test_stores_are_shared_between_handles(tables):
+    owner, other = tables
+    owner.store(0x1234, 3, True, 1.5)
+    assert other.get(0x1234, 3, True) == 1.5
+    other.store(0x5678, 3, True, 2.5)
+    assert owner.get(0x1234, 3, True) is None
+    assert owner.get(0x5678, 3, True) == 2.5
+    assert owner.get(0x5678, 3, False) is None
+
+
+def test_deeper_entries_are_kept(tables):
+    owner, other = tables
+    owner.store(0x1234, 4, False, 1.5)
+    other.store(0x5678, 2, False, 2.5)
+    assert owner.get(0x1234, 4, False) == 1.5
+    assert other.rejections == 1
+
+
+def test_read_during_a_store_is_not_torn(tables):
+    owner, other = tables
+    owner.store(0x1234, 3, True, 1.5)
+
+    def write():
+        other.values[1] = 2.5
+
+    words, owner.words = owner.words, PausedWriter(owner.words, 3, write)
+    try:
+        assert owner.get(0x1234, 3, True) == 1.5
+    finally:
+        owner.words = words